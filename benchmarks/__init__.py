@@ -0,0 +1,17 @@
+"""
+Benchmarks of the measurement, analysis, simulation and alignment hot paths, run with airspeed velocity (asv), see
+asv.conf.json in the repository root. Results are stored per commit in .asv/results, "asv compare" shows the
+changes between two commits. Every suite runs without lab hardware, measurements use backends.SimBackend.
+Benchmarks of functions a commit does not have yet are skipped on that commit (NotImplementedError in setup), so
+the suite also records the commits before them.
+"""
+import importlib.util
+import os
+import sys
+import matplotlib
+
+matplotlib.use('Agg')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if importlib.util.find_spec('analysis') is None:  # not in an asv environment, use the working tree
+    sys.path[:0] = [os.path.join(ROOT, 'electrical'), os.path.join(ROOT, 'microscope_stages')]
@@ -0,0 +1,26 @@
+"""Stage coordinate transforms of microscope_stages/alignment.py, applied to a scan of points."""
+import numpy as np
+import alignment
+
+
+class Transforms:
+    params = [[10, 100, 1000]]
+    param_names = ['n_points']
+
+    def setup(self, n_points):
+        self.points = np.random.default_rng(0).uniform(-1000, 1000, (n_points, 2))
+        self.tran = np.array([1250.0, -310.0])
+        self.angle = 1.3
+        self.zoom = 0.98
+
+    def time_uv2xy(self, n_points):
+        for point in self.points:
+            alignment.uv2xy(point, self.tran, self.angle, self.zoom)
+
+    def time_uv2xy_relative(self, n_points):
+        for point in self.points:
+            alignment.uv2xy(point, self.tran, self.angle, self.zoom, include_trans=False)
+
+    def time_xy2uv(self, n_points):
+        for point in self.points:
+            alignment.xy2uv(point, self.tran, self.angle, self.zoom)
@@ -0,0 +1,100 @@
+"""Device classification, averages and the plots and tables written at the end of a run."""
+import inspect
+import shutil
+import tempfile
+import matplotlib.pyplot as plt
+from .common import device_list, make_master, require
+import analysis
+
+LivePlot = getattr(analysis, 'LivePlot', None)
+
+
+class DeviceStats:
+    """Live/dead classification and per-device averages of a results table with 46 devices."""
+    params = [[100, 1000, 10000]]
+    param_names = ['repeats']
+
+    def setup(self, repeats):
+        self.df = make_master(46, repeats, sweeps=False)
+
+    def time_get_live_devices(self, repeats):
+        analysis.get_live_devices(self.df)
+
+    def time_get_dead_devices(self, repeats):
+        analysis.get_dead_devices(self.df)
+
+    def time_get_G_average(self, repeats):
+        analysis.get_G_average(self.df)
+
+
+class PlotAllLive:
+    """Full redraw of the live G vs time plot from the results table."""
+    params = [[10, 100, 1000]]
+    param_names = ['repeats']
+
+    def setup(self, repeats):
+        self.df = make_master(46, repeats, sweeps=False)
+        self.fig, self.ax = plt.subplots()
+
+    def teardown(self, repeats):
+        plt.close(self.fig)
+
+    def time_plot_all_live(self, repeats):
+        self.ax.cla()
+        analysis.plot_all_live(self.df, self.ax)
+
+
+class LivePlotRedraw:
+    """analysis.LivePlot redraw after appending one repeat, the replacement of the full redraw."""
+    params = [[10, 100, 1000]]
+    param_names = ['repeats']
+
+    def setup(self, repeats):
+        require(LivePlot)
+        df = make_master(46, repeats, sweeps=False)
+        self.fig, ax = plt.subplots()
+        self.live_plot = LivePlot(ax, device_list(46), interval=0)
+        self.live_plot.add_many(df.device, df.time, df.G)
+        self.live_plot.redraw(force=True)
+        self.last = df[df.repeat == repeats - 1]
+
+    def teardown(self, repeats):
+        plt.close(self.fig)
+
+    def time_live_plot_redraw(self, repeats):
+        self.live_plot.add_many(self.last.device, self.last.time, self.last.G)
+        self.live_plot.redraw(force=True)
+
+
+class SaveForManualPlot:
+    """Wide time/G table of all devices written at the end of a run."""
+    params = [[100, 1000, 10000]]
+    param_names = ['repeats']
+
+    def setup(self, repeats):
+        self.df = make_master(46, repeats, sweeps=False)
+        self.path = tempfile.mkdtemp()
+
+    def teardown(self, repeats):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def time_save_for_manual_plot(self, repeats):
+        analysis.save_for_manual_plot(self.df, self.path)
+
+    def peakmem_save_for_manual_plot(self, repeats):
+        analysis.save_for_manual_plot(self.df, self.path)
+
+
+class SaveForManualPlotChunked(SaveForManualPlot):
+    """The same table written in blocks of 1000 rows."""
+
+    def setup(self, repeats):
+        if 'chunksize' not in inspect.signature(analysis.save_for_manual_plot).parameters:
+            raise NotImplementedError('save_for_manual_plot writes in one block on this commit')
+        SaveForManualPlot.setup(self, repeats)
+
+    def time_save_for_manual_plot(self, repeats):
+        analysis.save_for_manual_plot(self.df, self.path, chunksize=1000)
+
+    def peakmem_save_for_manual_plot(self, repeats):
+        analysis.save_for_manual_plot(self.df, self.path, chunksize=1000)
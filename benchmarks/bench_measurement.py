@@ -0,0 +1,90 @@
+"""Results table accumulation, per sweep fitting and the full measurement loop on the simulated backend."""
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from .common import device_list, require, sweep_array, sweep_items, START_END_STEP
+
+try:
+    import measurement
+except ImportError:  # imported the instrument drivers before backends.py
+    measurement = None
+try:
+    from results import ResultsBuffer
+except ImportError:
+    ResultsBuffer = None
+try:
+    from backends import SimBackend
+except ImportError:
+    SimBackend = None
+
+
+class MergeDF:
+    """Building the results table of a run one sweep at a time with merge_df."""
+    params = [[50, 200, 1000]]
+    param_names = ['n_sweeps']
+
+    def setup(self, n_sweeps):
+        require(measurement)
+        self.items = sweep_items(n_sweeps)
+        self.fits = [measurement.fit_for_Master(df) for Params, df in self.items]
+
+    def time_merge_df(self, n_sweeps):
+        Master = pd.DataFrame()
+        for (Params, df), Fit in zip(self.items, self.fits):
+            Master = measurement.merge_df(dict(Params), dict(Fit), Master)
+
+
+class ResultsBufferAdd:
+    """The same table built in a preallocated results.ResultsBuffer."""
+    params = [[50, 200, 1000]]
+    param_names = ['n_sweeps']
+
+    def setup(self, n_sweeps):
+        require(measurement, ResultsBuffer)
+        self.items = sweep_items(n_sweeps)
+        self.fits = [measurement.fit_for_Master(df) for Params, df in self.items]
+
+    def time_results_buffer(self, n_sweeps):
+        results = ResultsBuffer(n_sweeps, len(sweep_array()))
+        for (Params, df), Fit in zip(self.items, self.fits):
+            results.add(Params, Fit)
+        results.to_dataframe()
+
+
+class FitForMaster:
+    """Linear fit of a single IV sweep."""
+    params = [[11, 101, 1001]]
+    param_names = ['n_points']
+
+    def setup(self, n_points):
+        require(measurement)
+        V_SD = np.linspace(0, -0.5, n_points)
+        noise = 1 + 0.01 * np.random.default_rng(0).standard_normal(n_points)
+        self.df = pd.DataFrame({'V_SD': V_SD, 'I_SD': 0.1 * V_SD * noise})
+
+    def time_fit_for_Master(self, n_points):
+        measurement.fit_for_Master(self.df)
+
+
+class MicrMeasure:
+    """measurement.micr_measure end to end on backends.SimBackend with a FakeClock (no waiting, no plot window):
+    pipeline, checkpointing, result files and summary figure."""
+    params = [[5, 20, 100]]
+    param_names = ['repeats']
+    number = 1
+    repeat = 3
+    timeout = 300
+
+    def setup(self, repeats):
+        require(measurement, SimBackend)
+        self.basePath = tempfile.mkdtemp()
+
+    def teardown(self, repeats):
+        shutil.rmtree(self.basePath, ignore_errors=True)
+
+    def time_micr_measure(self, repeats):
+        backend = SimBackend(device_list(46), repeats=repeats, event_repeat=repeats // 2, seed=0)
+        measurement.micr_measure(deviceList=device_list(46), repeats=repeats, start_end_step=START_END_STEP,
+                                 settle_time=0.0, backend=backend, basePath=self.basePath, plot=False,
+                                 control_port=None)
@@ -0,0 +1,54 @@
+"""Synthetic G data and IV sweeps."""
+import inspect
+import random
+import numpy as np
+from .common import device_list, make_G, require, sweep_array
+import simulation_utils
+
+synthesize_sweeps = getattr(simulation_utils, 'synthesize_sweeps', None)
+
+
+def seeded_data(n_devices, repeats, seed=0):
+    """simulation_utils.generate_data with the G step in the middle. Older commits draw from the global random
+    generators, which are seeded instead."""
+    if 'seed' in inspect.signature(simulation_utils.generate_data).parameters:
+        return simulation_utils.generate_data(device_list=device_list(n_devices), repeats=repeats,
+                                              event_repeat=repeats // 2, seed=seed)
+    random.seed(seed)
+    np.random.seed(seed)
+    return simulation_utils.generate_data(device_list=device_list(n_devices), repeats=repeats,
+                                          event_repeat=repeats // 2)
+
+
+class GenerateData:
+    params = [[46, 460], [100, 1000, 10000]]
+    param_names = ['n_devices', 'repeats']
+    timeout = 300  # the per-element loops before the vectorized generator
+
+    def time_generate_data(self, n_devices, repeats):
+        seeded_data(n_devices, repeats)
+
+
+class SynthesizeSweeps:
+    """All sweeps of a 46 device run at once (generate_IV on the G matrix) against chunk by chunk with fitting
+    (synthesize_sweeps)."""
+    params = [[100, 1000, 10000]]
+    param_names = ['repeats']
+
+    def setup(self, repeats):
+        require(synthesize_sweeps)  # generate_IV takes a G matrix from the same commit on
+        self.G = make_G(46, repeats)
+        self.V_SD = sweep_array()
+        self.devices = device_list(46)
+
+    def time_generate_IV(self, repeats):
+        simulation_utils.generate_IV(self.G, self.V_SD, seed=0)
+
+    def time_synthesize_sweeps(self, repeats):
+        synthesize_sweeps(self.G, self.V_SD, self.devices, chunksize=10000, seed=0)
+
+    def peakmem_generate_IV(self, repeats):
+        simulation_utils.generate_IV(self.G, self.V_SD, seed=0)
+
+    def peakmem_synthesize_sweeps(self, repeats):
+        synthesize_sweeps(self.G, self.V_SD, self.devices, chunksize=10000, seed=0)
@@ -0,0 +1,67 @@
+"""Synthetic results tables for the benchmark suites. They are made with numpy and pandas only, so the suites set
+up the same inputs on every commit, also the ones before the seeded and batched simulation."""
+import numpy as np
+import pandas as pd
+
+START_END_STEP = [0, -0.5, 0.1]
+SWEEP_TIME = 0.6  # s per sweep, the time column of the synthetic tables
+
+
+def device_list(n_devices):
+    return [i for i in range(1, n_devices + 1)]
+
+
+def sweep_array(start_end_step=START_END_STEP):
+    """Out and back sweep like U.targetArray([start, end, start], stepsize=step)."""
+    start, end, step = start_end_step
+    out = np.linspace(start, end, int(round(abs(end - start) / step)) + 1)
+    return np.concatenate([out, out[-2::-1]])
+
+
+def make_G(n_devices, repeats, seed=0):
+    """device x repeat conductances like simulation_utils.generate_data: about 10 % dead devices (G = 0), the rest
+    around 0.1 S with a 15 % drop in the middle. Drawn here, so every commit is benchmarked on the same data."""
+    rng = np.random.default_rng(seed)
+    G1 = np.where(rng.random(n_devices) < 0.9, 0.02 * rng.standard_normal(n_devices) + 0.1, 0.0)
+    levels = np.where(np.arange(repeats) < repeats // 2, G1[:, None], 0.85 * G1[:, None])
+    return levels + 0.0001 * rng.standard_normal((n_devices, repeats)) * (G1[:, None] > 0)
+
+
+def make_master(n_devices=46, repeats=100, sweeps=True, seed=0):
+    """MasterDF of a simulated run: n_devices devices (about 10 % dead) measured repeats times with a G step in
+    the middle. sweeps=False leaves out the V_SD and I_SD columns."""
+    G = make_G(n_devices, repeats, seed).T.reshape(-1)  # repeat-major, like the measurement loop
+    V_SD = sweep_array()
+    I_SD = V_SD * G[:, None] * (1 + 0.01 * np.random.default_rng(seed).standard_normal((len(G), len(V_SD))))
+    dx = V_SD - V_SD.mean()
+    dy = I_SD - I_SD.mean(axis=1)[:, None]
+    slope = dy @ dx / (dx @ dx)
+    residual = dy - slope[:, None] * dx
+    std_err = np.sqrt((residual ** 2).sum(axis=1) / (len(V_SD) - 2) / (dx @ dx))
+    ID = np.arange(1, len(G) + 1)
+    df = pd.DataFrame({'ID': ID, 'repeat': (ID - 1) // n_devices, 'time': (ID - 1) * SWEEP_TIME})
+    df['datetime'] = pd.Timestamp('2021-01-01') + pd.to_timedelta(df['time'], unit='s')
+    df['device'] = np.tile(device_list(n_devices), repeats)
+    if sweeps:
+        df['V_SD'] = np.broadcast_to(V_SD, I_SD.shape).tolist()
+        df['I_SD'] = I_SD.tolist()
+    df['G'] = slope
+    df['std_err'] = std_err
+    return df
+
+
+def sweep_items(n_sweeps, seed=0):
+    """(Params, df) pairs as the measurement loop produces them, for n_sweeps sweeps of 46 devices."""
+    df = make_master(46, -(-n_sweeps // 46), seed=seed).iloc[:n_sweeps]
+    items = []
+    for row in df.itertuples(index=False):
+        Params = {'ID': [row.ID], 'repeat': row.repeat, 'time': [row.time], 'datetime': [row.datetime],
+                  'device': [row.device], 'V_SD': [row.V_SD], 'I_SD': [row.I_SD]}
+        items.append((Params, pd.DataFrame({'V_SD': row.V_SD, 'I_SD': row.I_SD})))
+    return items
+
+
+def require(*objects):
+    """Skips a benchmark (asv treats NotImplementedError in setup as skipped) on commits without the objects."""
+    if any(obj is None for obj in objects):
+        raise NotImplementedError('not available on this commit')
@@ -1,28 +1,61 @@
+import time
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.pyplot import cm
 from scipy import stats
+from running_stats import RunningStats
+from changepoint import find_event_repeat
+from resampling import compare
+
+# plot style of the summary figures, renamed seaborn-v0_8 in matplotlib 3.6
+STYLE = 'seaborn' if 'seaborn' in plt.style.available else 'seaborn-v0_8'
+
+
+def classify_devices(df, cutoff=5e-6):
+    """Splits the devices into live (max G above cutoff) and dead (max G below cutoff) with a single groupby.
+    Returns (live_list, dead_list, device_stats), device_stats has G_max, G_min and n (number of sweeps)
+    per device. Devices are listed in the order they first appear in df."""
+    device_stats = df.groupby('device', sort=False)['G'].agg(['max', 'min', 'count'])
+    device_stats.columns = ['G_max', 'G_min', 'n']
+    live_list = device_stats.index[device_stats.G_max > cutoff].tolist()
+    dead_list = device_stats.index[device_stats.G_max < cutoff].tolist()
+    return live_list, dead_list, device_stats
 
 
 def get_live_devices(df, cutoff=5e-6):
-    device_list = df.device.unique()
-    live_list = []
-    for device in device_list:
-        df1 = df[df['device'] == device]
-        if df1['G'].max() > cutoff:
-            live_list.append(device)
-    return live_list
+    return classify_devices(df, cutoff=cutoff)[0]
 
 
 def get_dead_devices(df, cutoff=5e-6):
-    device_list = df.device.unique()
-    dead_list = []
-    for device in device_list:
-        df1 = df[df['device'] == device]
-        if df1['G'].max() < cutoff:
-            dead_list.append(device)
-    return dead_list
+    return classify_devices(df, cutoff=cutoff)[1]
+
+
+class DeviceClassifier:
+    """Incremental version of classify_devices for the live plot, updated with one sweep at a time."""
+
+    def __init__(self, cutoff=5e-6):
+        self.cutoff = cutoff
+        self.G_max = {}
+        self.G_min = {}
+        self.n = {}
+
+    def update(self, device, G):
+        """Adds one sweep. Returns True if the device changed between live and dead (or was new)."""
+        was_live = self.is_live(device) if device in self.n else None
+        self.G_max[device] = max(self.G_max.get(device, G), G)
+        self.G_min[device] = min(self.G_min.get(device, G), G)
+        self.n[device] = self.n.get(device, 0) + 1
+        return was_live != self.is_live(device)
+
+    def is_live(self, device):
+        return self.G_max[device] > self.cutoff
+
+    def live(self):
+        return [device for device in self.n if self.G_max[device] > self.cutoff]
+
+    def dead(self):
+        return [device for device in self.n if self.G_max[device] < self.cutoff]
 
 
 def plot_all(df,
@@ -30,49 +63,52 @@ def plot_all(df,
              cutoff=1E-5,
              plot_repeat=False,
              save=False,
-             basepath='G:/Shared drives/Nanoelectronics Team Drive/Data/2021/Marta/test_folder'):
-    device_list = df.device.unique()
+             basepath='G:/Shared drives/Nanoelectronics Team Drive/Data/2021/Marta/test_folder',
+             close=False):
+    """Summary plot of G of all devices, saved as summary.png in basepath with save=True.
+    Returns the figure, close=True closes it after saving (for batch rendering)."""
     dfa = get_G_average(df)
 
-    live_devices = get_live_devices(df, cutoff=cutoff)
-    dead_devices = get_dead_devices(df, cutoff=cutoff)
+    live_devices, dead_devices, device_stats = classify_devices(df, cutoff=cutoff)
+    per_device = dict(tuple(df.groupby('device', sort=False)))
 
     line_styles = ['-', '--', '-.', ':']
-    plt.style.use('seaborn')
-    centimetre = 1 / 2.54
-    color = iter(cm.tab20(np.linspace(0, 1, len(live_devices))))  # change 46 to i
+    with plt.style.context(STYLE):
+        centimetre = 1 / 2.54
+        color = iter(cm.tab20(np.linspace(0, 1, len(live_devices))))  # change 46 to i
 
-    fig, ax1 = plt.subplots(figsize=(30 * centimetre, 20 * centimetre))
-    plt.subplots_adjust(left=None, bottom=None, right=0.8, top=None, wspace=None, hspace=None)
+        fig, ax1 = plt.subplots(figsize=(30 * centimetre, 20 * centimetre))
+        plt.subplots_adjust(left=None, bottom=None, right=0.8, top=None, wspace=None, hspace=None)
 
-    G_mean = dfa.G_mean[live_devices].mean()
-    G_std = dfa.G_std[live_devices].mean()
-    add_text = 'G_mean_live = ' + '{:.2E}'.format(G_mean) + '\n' + 'G_mean_std_live = ' + '{:.2E}'.format(G_std)
-    ax1.text(1.03, 0.0, add_text, transform=ax1.transAxes)
-
-    if plot_repeat:
-        xlabel = 'repeat'
-        xtype = 'repeat'
-    else:
-        xlabel = 'time (s)'
-        xtype = 'time'
-
-    ax1.set_title(title)
-    ax1.set(xlabel=xlabel, ylabel='G (S)')
-    for i, device in enumerate(live_devices):
-        df1 = df[df['device'] == device]
-        ax1.plot(df1[xtype], df1['G'], color=next(color), label=device, linestyle=line_styles[i % 4 - 1])
-        ax1.legend(ncol=2, loc=9, bbox_to_anchor=(1.13, 1.0))
+        G_mean = dfa.G_mean[live_devices].mean()
+        G_std = dfa.G_std[live_devices].mean()
+        add_text = 'G_mean_live = ' + '{:.2E}'.format(G_mean) + '\n' + 'G_mean_std_live = ' + '{:.2E}'.format(G_std)
+        ax1.text(1.03, 0.0, add_text, transform=ax1.transAxes)
 
-    for device in dead_devices:
-        df1 = df[df['device'] == device]
-        ax1.plot(df1[xtype], df1['G'], color='gray', label=device, linestyle='-')
+        if plot_repeat:
+            xlabel = 'repeat'
+            xtype = 'repeat'
+        else:
+            xlabel = 'time (s)'
+            xtype = 'time'
+
+        ax1.set_title(title)
+        ax1.set(xlabel=xlabel, ylabel='G (S)')
+        for i, device in enumerate(live_devices):
+            df1 = per_device[device]
+            ax1.plot(df1[xtype], df1['G'], color=next(color), label=device, linestyle=line_styles[i % 4 - 1])
+
+        for device in dead_devices:
+            df1 = per_device[device]
+            ax1.plot(df1[xtype], df1['G'], color='gray', label=device, linestyle='-')
         ax1.legend(ncol=2, loc=9, bbox_to_anchor=(1.13, 1.0))
 
-    if save:
-        save_at = basepath + '/summary.png'
-        fig.savefig(save_at)
-    return
+        if save:
+            save_at = basepath + '/summary.png'
+            fig.savefig(save_at)
+    if close:
+        plt.close(fig)
+    return fig
 
 
 def get_G_average(df):
@@ -81,33 +117,75 @@ def get_G_average(df):
     return dfa
 
 
-def plot_IV(df, device=None, ID=None, repeat=None):
-    """Supply either an ID or a device number with the repeat number"""
+def load_IV(df, device=None, ID=None, repeat=None, store=None):
+    """Returns (V_SD, I_SD) of one sweep, selected by ID or by device and repeat.
+    With a sweep_store.SweepStore the trace is sliced from the binary store, a compact df (see results.py) gives
+    it from its shared sweep arrays, otherwise it is parsed from df."""
+    if ID is None:
+        df1 = df.loc[(df['device'] == device) & (df['repeat'] == repeat)]
+        ID = df1['ID'].tolist()[0]
+    if store is not None:
+        return store.get(ID)
+    if 'sweeps' in df.attrs and 'sweep' in df:
+        return df.attrs['sweeps'].get(df.loc[df['ID'] == ID, 'sweep'].iloc[0])
+    df1 = df[df['ID'] == ID]
+    x, y = df1['V_SD'].tolist()[0], df1['I_SD'].tolist()[0]
+    if isinstance(x, str):  # list repr read back from a csv
+        x = list(map(float, x.replace('[', '').replace(']', '').split(',')))
+        y = list(map(float, y.replace('[', '').replace(']', '').split(',')))
+    return x, y
+
+
+def plot_IV(df, device=None, ID=None, repeat=None, store=None):
+    """Supply either an ID or a device number with the repeat number.
+    Pass the run's sweep_store.SweepStore as store to read the trace from the binary sweep files."""
     fig, ax1 = plt.subplots()
 
-    if repeat is None and ID is None:
+    if (repeat is None or device is None) and ID is None:
         print('specify device and repeat OR ID.')
-    if ID is not None:
-        df1 = df[df['ID'] == ID]
-        x = list(map(float, df1['V_SD'].tolist()[0].replace('[', '').replace(']', '').split(',')))
-        y = list(map(float, df1['I_SD'].tolist()[0].replace('[', '').replace(']', '').split(',')))
-        ax1.plot(x, y)
-    if repeat is not None and device is not None:
-        df1 = df.loc[(df['device'] == device) & (df['repeat'] == repeat)]
-        x = list(map(float, df1['V_SD'].tolist()[0].replace('[', '').replace(']', '').split(',')))
-        y = list(map(float, df1['I_SD'].tolist()[0].replace('[', '').replace(']', '').split(',')))
-        ax1.plot(x, y)
+        return
+    x, y = load_IV(df, device=device, ID=ID, repeat=repeat, store=store)
+    ax1.plot(x, y)
 
 
-def check_values(df,
-                 R_ev=1e3,
-                 device_type='top',
-                 tol=0.1,
-                 rel_std=0.005,
-                 R_zero_tol=1e6,
-                 zero_std_tol=1e6,
-                 save=False,
-                 basePath='G:/Shared drives/Nanoelectronics Team Drive/Data/2021/Marta/test'):
+# devices on the top and bottom electrodes of the test chip, check_values expects one of them connected
+DEVICE_LAYOUT = {'top': list(range(1, 12 + 1)) + list(range(24, 34 + 1)),
+                 'bottom': list(range(13, 23 + 1)) + list(range(35, 46 + 1))}
+
+
+def layout_devices(device_type, layout=DEVICE_LAYOUT):
+    """Returns (connected devices, disconnected devices) for device_type 'top', 'bottom' or 'all'."""
+    if device_type == 'all':
+        return [device for devices in layout.values() for device in devices], []
+    dead_devices = [device for key, devices in layout.items() if key != device_type for device in devices]
+    return list(layout[device_type]), dead_devices
+
+
+def qc_masks(dfa, device_type='top', R_ev=1e3, tol=0.1, rel_std=0.005, R_zero_tol=1e6, zero_std_tol=1e6,
+             layout=DEVICE_LAYOUT):
+    """G tolerance and noise criteria of check_values for all devices at once.
+    dfa is the get_G_average table. Returns a table indexed by device with G_mean, G_std, connected,
+    G_OK and noise_OK; devices missing from dfa fail both criteria."""
+    ev = 1 / (R_ev + 100)  # 100 ohm internal resistance of multiplexer
+    zero_tol = 1 / R_zero_tol
+    live_devices, dead_devices = layout_devices(device_type, layout)
+    qc = dfa[['G_mean', 'G_std']].reindex(live_devices + dead_devices)
+    qc.index.name = 'device'
+    connected = qc.index.isin(live_devices)
+    G = qc.G_mean.to_numpy()
+    rel = (qc.G_std / qc.G_mean).to_numpy()
+    with np.errstate(invalid='ignore'):
+        G_OK_live = (G * (1 + tol) > ev) & (G * (1 - tol) < ev)
+        G_OK_dead = (G < zero_tol) & (G * tol < zero_tol)
+        qc['connected'] = connected
+        qc['G_OK'] = np.where(connected, G_OK_live, G_OK_dead)
+        qc['noise_OK'] = np.where(connected, rel < rel_std, rel < zero_std_tol)
+    return qc
+
+
+def qc_report(qc, device_type='top', R_ev=1e3, tol=0.1, rel_std=0.005, R_zero_tol=1e6,
+              basePath='G:/Shared drives/Nanoelectronics Team Drive/Data/2021/Marta/test'):
+    """The text report of check_values from a qc_masks table."""
     completeReport = ('R expected: ' + str(R_ev) + 'Ohm \n' +
                       'type: ' + str(device_type) + '\n' +
                       'tol = ' + str(tol) + '\n' +
@@ -115,93 +193,47 @@ def check_values(df,
                       'R_zero_tol = ' + str(R_zero_tol) + '\n' +
                       'base path = ' + basePath + '\n \n')
 
-    ev = 1 / (R_ev + 100)  # 100 ohm internal resistance of multiplexer
-    zero_tol = 1 / R_zero_tol
-
-    top_devices = [i for i in range(1, 12 + 1)] + [i for i in range(24, 34 + 1)]
-    bottom_devices = [i for i in range(13, 23 + 1)] + [i for i in range(35, 46 + 1)]
-    all_devices = top_devices + bottom_devices
-
-    dfa = get_G_average(df)
-    print(dfa)
-
-    G_OK = []
-    noise_OK = []
-    G_bad = []
-    noise_bad = []
-
-    if device_type == 'top':
-        live_devices = top_devices
-        dead_devices = bottom_devices
-    elif device_type == 'bottom':
-        live_devices = bottom_devices
-        dead_devices = top_devices
-    elif device_type == 'all':
-        live_devices = all_devices
-        dead_devices = []
-
-    # check live devices
-    for device in live_devices:
-        G = dfa.G_mean[device]
-        std = dfa.G_std[device]
-        if (G * (1 + tol) > ev) & (G * (1 - tol) < ev):
-            G_OK.append(device)
-        else:
-            G_bad.append(device)
-        if (std / G < rel_std):
-            noise_OK.append(device)
-        else:
-            noise_bad.append(device)
-
-    G_a_live = dfa.G_mean[G_OK].mean()
-    STD_a_live = dfa.G_std[G_OK].mean()
-
-    report_c = ('G average of devices within range =  ' + str(G_a_live) + ' S \n' +
-                'STD average of devices within range =  ' + str(STD_a_live) + ' S \n \n' +
-                'Report for connected devices = ' + str(live_devices) + '\n'
-                                                                        'G within range for devices: ' + str(
-                G_OK) + '\n'
-                        'G out of range for devices: ' + str(G_bad) + '\n'
-                                                                      'noise within range for devices: ' + str(
-                noise_OK) + '\n'
-                            'noise out of range range for devices: ' + str(noise_bad) + '\n \n'
-                )
-
-    # print(report_c)
-    # check disconnected devices
-    completeReport = completeReport + report_c
-
-    G_OK = []
-    noise_OK = []
-    G_bad = []
-    noise_bad = []
-    for device in dead_devices:
-        G = dfa.G_mean[device]
-        std = dfa.G_std[device]
-        if (G < zero_tol) & (G * tol < zero_tol):
-            G_OK.append(device)
-        else:
-            G_bad.append(device)
-        if (std / G < zero_std_tol):
-            noise_OK.append(device)
-        else:
-            noise_bad.append(device)
+    live = qc[qc.connected]
+    G_OK = live.index[live.G_OK].tolist()
+    completeReport += ('G average of devices within range =  ' + str(live.G_mean[live.G_OK].mean()) + ' S \n' +
+                       'STD average of devices within range =  ' + str(live.G_std[live.G_OK].mean()) + ' S \n \n' +
+                       'Report for connected devices = ' + str(live.index.tolist()) + '\n'
+                       'G within range for devices: ' + str(G_OK) + '\n'
+                       'G out of range for devices: ' + str(live.index[~live.G_OK].tolist()) + '\n'
+                       'noise within range for devices: ' + str(live.index[live.noise_OK].tolist()) + '\n'
+                       'noise out of range range for devices: ' + str(live.index[~live.noise_OK].tolist()) + '\n \n'
+                       )
 
     if device_type != 'all':
-        G_a_live = dfa.G_mean[G_OK].mean()
-        STD_a_live = dfa.G_std[G_OK].mean()
+        dead = qc[~qc.connected]
+        completeReport += ('G average of disconnected devices within range =  ' +
+                           str(dead.G_mean[dead.G_OK].mean()) + ' S \n' +
+                           'STD average of disconnected devices within range =  ' +
+                           str(dead.G_std[dead.G_OK].mean()) + ' S \n \n' +
+                           'Report for disconnected devices = ' + str(dead.index.tolist()) + '\n'
+                           'G within range for devices: ' + str(dead.index[dead.G_OK].tolist()) + '\n'
+                           'G out of range for devices: ' + str(dead.index[~dead.G_OK].tolist()) + '\n'
+                           'noise within range for devices: ' + str(dead.index[dead.noise_OK].tolist()) + '\n'
+                           'noise out of range range for devices: ' + str(dead.index[~dead.noise_OK].tolist()) + '\n'
+                           )
+    return completeReport
 
-        report_d = ('G average of disconnected devices within range =  ' + str(G_a_live) + ' S \n' +
-                    'STD average of disconnected devices within range =  ' + str(STD_a_live) + ' S \n \n' +
-                    'Report for disconnected devices = ' + str(dead_devices) + '\n'
-                    'G within range for devices: ' + str(G_OK) + '\n'
-                    'G out of range for devices: ' + str(G_bad) + '\n'
-                    'noise within range for devices: ' + str(noise_OK) + '\n'
-                    'noise out of range range for devices: ' + str(noise_bad) + '\n'
-                    )
 
-        completeReport = completeReport + report_d
+def check_values(df,
+                 R_ev=1e3,
+                 device_type='top',
+                 tol=0.1,
+                 rel_std=0.005,
+                 R_zero_tol=1e6,
+                 zero_std_tol=1e6,
+                 save=False,
+                 basePath='G:/Shared drives/Nanoelectronics Team Drive/Data/2021/Marta/test',
+                 layout=DEVICE_LAYOUT):
+    dfa = get_G_average(df)
+    print(dfa)
 
+    qc = qc_masks(dfa, device_type, R_ev, tol, rel_std, R_zero_tol, zero_std_tol, layout)
+    completeReport = qc_report(qc, device_type, R_ev, tol, rel_std, R_zero_tol, basePath)
     print(completeReport)
 
     if save:
@@ -214,14 +246,64 @@ def check_values(df,
     return dfa
 
 
+def _check_run(task):
+    """check_values for one run in a worker process. Returns (qc table, text report)."""
+    path, master_path, device_type, R_ev, tol, rel_std, R_zero_tol, zero_std_tol, layout, save = task
+    dfa = get_G_average(pd.read_csv(master_path, usecols=['device', 'G']))
+    qc = qc_masks(dfa, device_type, R_ev, tol, rel_std, R_zero_tol, zero_std_tol, layout)
+    report = qc_report(qc, device_type, R_ev, tol, rel_std, R_zero_tol, str(path))
+    if save:
+        dfa.to_csv(str(path) + '/dfa.csv')
+        with open(str(path) + '/testchip_summary.txt', 'w') as f:
+            f.write(report)
+    return qc, report
+
+
+def check_values_batch(runs,
+                       device_type=None,
+                       R_ev=1e3,
+                       tol=0.1,
+                       rel_std=0.005,
+                       R_zero_tol=1e6,
+                       zero_std_tol=1e6,
+                       save=False,
+                       layout=DEVICE_LAYOUT,
+                       n_jobs=None):
+    """check_values for many chips, one chip per worker process.
+    runs are catalog.Run objects (e.g. from RunCatalog.select) or run folders. device_type None takes the
+    device type recorded for each run. Returns (summary, reports): summary is one table indexed by run and
+    device with G_mean, G_std, connected, G_OK and noise_OK, reports maps run name to the text report.
+    n_jobs is the number of processes (parallel.map_tasks: all CPUs if None, 1 runs in this process)."""
+    from catalog import Run
+    from parallel import map_tasks
+
+    runs = [run if isinstance(run, Run) else Run(run) for run in runs]
+    tasks = []
+    for run in runs:
+        run_type = device_type if device_type is not None else run.meta.get('device_type', 'all')
+        if run_type not in layout and run_type != 'all':
+            print(run.name + ': unknown device type ' + repr(run_type) + ', checking all devices')
+            run_type = 'all'
+        tasks.append((run.path, run.master_path, run_type, R_ev, tol, rel_std, R_zero_tol, zero_std_tol, layout, save))
+
+    results = map_tasks(_check_run, tasks, n_jobs)
+
+    reports = {run.name: report for run, (qc, report) in zip(runs, results)}
+    if not results:
+        return pd.DataFrame(), reports
+    summary = pd.concat({run.name: qc for run, (qc, report) in zip(runs, results)}, names=['run'])
+    summary.insert(0, 'device_type', [task[2] for task, (qc, report) in zip(tasks, results) for device in qc.index])
+    return summary, reports
+
+
 def plot_all_live_add_legend(ax1):
     ax1.legend(ncol=2, loc=9, bbox_to_anchor=(1.13, 1.0))
     print('added legend')
 
 
 def plot_all_live(df, ax1, title='sample name', cutoff=-10, label=False):
-    live_devices = get_live_devices(df, cutoff=cutoff)
-    dead_devices = get_dead_devices(df, cutoff=cutoff)
+    live_devices, dead_devices, device_stats = classify_devices(df, cutoff=cutoff)
+    per_device = dict(tuple(df.groupby('device', sort=False)))
 
     linestyles = ['-', '--', '-.', ':']
     color = iter(cm.tab20(np.linspace(0, 1, len(live_devices))))
@@ -230,14 +312,14 @@ def plot_all_live(df, ax1, title='sample name', cutoff=-10, label=False):
     ax1.set(xlabel='time (s)', ylabel='G (S)')
 
     for i, device in enumerate(live_devices):
-        df1 = df[df['device'] == device]
+        df1 = per_device[device]
         if label:
             ax1.plot(df1['time'], df1['G'], color=next(color), label=device, linestyle=linestyles[i % 4 - 1])
         if not label:
             ax1.plot(df1['time'], df1['G'], color=next(color), linestyle=linestyles[i % 4 - 1])
 
     for device in dead_devices:
-        df1 = df[df['device'] == device]
+        df1 = per_device[device]
         if label:
             ax1.plot(df1['time'], df1['G'], color='gray', label=device, linestyle='-')
         if not label:
@@ -249,89 +331,247 @@ def plot_all_live(df, ax1, title='sample name', cutoff=-10, label=False):
     return legend
 
 
-def save_for_manual_plot(df, path, save=True):
-    device_list = df.device.unique()
-    df_plot = pd.DataFrame()
-    df_plot['repeat'] = list(df.repeat[df['device'] == device_list[0]])
-    for device in device_list:
-        S_time = df.time[df['device'] == device]
-        S_G = df.G[df['device'] == device]
-        df_plot['time_device' + str(device)] = list(S_time)
-        df_plot['G_device' + str(device)] = list(S_G)
-    if save:
-        df_plot.to_csv(path + '/for_manual_plotting.csv')
+class LivePlot:
+    """Live G vs time plot for the measurement loop. Keeps one line per device and only appends the new
+    points, redraws are blitted and happen at most once every interval seconds."""
+
+    def __init__(self, ax1, deviceList, title='sample name', cutoff=-10, interval=1.0):
+        self.ax1 = ax1
+        self.canvas = ax1.figure.canvas
+        self.interval = interval
+        self.last_draw = 0
+        self.background = None
+        self.rescale = True
+
+        linestyles = ['-', '--', '-.', ':']
+        colors = cm.tab20(np.linspace(0, 1, len(deviceList)))
+        ax1.set_title(title)
+        ax1.set(xlabel='time (s)', ylabel='G (S)')
+
+        self.x = {}
+        self.y = {}
+        self.classifier = DeviceClassifier(cutoff=cutoff)
+        self.stats = RunningStats()  # per-device mean/std, updated with every point
+        self.colors = {}
+        self.lines = {}
+        for i, device in enumerate(deviceList):
+            self.x[device] = []
+            self.y[device] = []
+            self.colors[device] = colors[i]
+            self.lines[device], = ax1.plot([], [], color=colors[i], label=device, linestyle=linestyles[i % 4 - 1],
+                                           animated=True)  # animated lines are only drawn by the blitting below
+        self.text = ax1.text(1.03, 0.0, '', transform=ax1.transAxes, animated=True)
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+
+    def _on_draw(self, event):
+        """Full redraws (first draw, rescaling, window resize) refresh the background used for blitting."""
+        self.background = self.canvas.copy_from_bbox(self.ax1.figure.bbox)
+        self._draw_animated()
+
+    def _draw_animated(self):
+        G_mean, G_std = self.stats.live_summary(self.classifier.live())
+        self.text.set_text('G_mean_live = ' + '{:.2E}'.format(G_mean) + '\n' +
+                           'G_mean_std_live = ' + '{:.2E}'.format(G_std))
+        for line in self.lines.values():
+            self.ax1.draw_artist(line)
+        self.ax1.draw_artist(self.text)
+
+    def add(self, device, t, G):
+        """Appends one point (time t, conductance G) to the line of device."""
+        self.x[device].append(t)
+        self.y[device].append(G)
+        self.lines[device].set_data(self.x[device], self.y[device])
+        self.stats.update(device, G)
+        if self.classifier.update(device, G):
+            self.lines[device].set_color(self.colors[device] if self.classifier.is_live(device) else 'gray')
+        x0, x1 = self.ax1.get_xlim()
+        y0, y1 = self.ax1.get_ylim()
+        if not (x0 <= t <= x1 and y0 <= G <= y1):
+            self.rescale = True
+
+    def add_many(self, devices, times, Gs):
+        """Appends a block of points, e.g. the rows of a resumed run."""
+        for device, t, G in zip(devices, times, Gs):
+            self.add(device, t, G)
+
+    def add_legend(self):
+        plot_all_live_add_legend(self.ax1)
+        self.rescale = True  # legend is part of the background
+
+    def _set_limits(self):
+        """Fits the axes to the data with headroom on the time axis, so the next points can be blitted
+        without another full redraw."""
+        self.ax1.relim()
+        self.ax1.autoscale_view()
+        x0, x1 = self.ax1.get_xlim()
+        self.ax1.set_xlim(x0, x1 + 0.25 * (x1 - x0))
+
+    def redraw(self, force=False):
+        """Redraws if interval seconds have passed since the last redraw. Always processes GUI events."""
+        now = time.time()
+        if force or now - self.last_draw >= self.interval:
+            if self.rescale or self.background is None or not getattr(self.canvas, 'supports_blit', True):
+                self._set_limits()
+                self.canvas.draw()  # calls _on_draw
+                self.rescale = False
+            else:
+                self.canvas.restore_region(self.background)
+                self._draw_animated()
+                self.canvas.blit(self.ax1.figure.bbox)
+            self.last_draw = now
+        self.canvas.flush_events()
+
+
+def _manual_plot_table(df, device_list, row):
+    """Wide table of the rows of df: repeat, then time_device<n> and G_device<n> for every device in device_list."""
+    if len(df) == 0:  # e.g. a run stopped before its first sweep
+        names = [prefix + str(device) for device in device_list for prefix in ('time_device', 'G_device')]
+        return pd.DataFrame({'repeat': pd.Series(dtype='Int64'), **{name: pd.Series(dtype=float) for name in names}})
+    wide = df[['repeat', 'time', 'G']].set_index([row, df['device']]).unstack('device')
+    repeat = wide['repeat'].reindex(columns=device_list)
+    # repeat of the first device that has the row
+    df_plot = pd.DataFrame({'repeat': repeat.bfill(axis=1).iloc[:, 0].astype('Int64')})
+    time = wide['time'].reindex(columns=device_list)  # one reindex per quantity, missing devices become NaN
+    time.columns = ['time_device' + str(device) for device in device_list]
+    G = wide['G'].reindex(columns=device_list)
+    G.columns = ['G_device' + str(device) for device in device_list]
+    interleaved = [name for pair in zip(time.columns, G.columns) for name in pair]
+    df_plot = pd.concat([df_plot, time, G], axis=1)[['repeat'] + interleaved]
+    df_plot.index.name = None
     return df_plot
 
 
-def basic_stat_2seg(df, event_repeat, plot_all_bool=False, cutoff=0):
-    plt.style.use('seaborn')
-    centimeter = 1 / 2.54
-    fig1, ((ax1, ax2), (ax3, ax4)) = plt.subplots(ncols=2, nrows=2, figsize=(20 * centimeter, 20 * centimeter))
-    plt.subplots_adjust(left=None, bottom=0.2, right=None, top=None, wspace=None, hspace=None)
-    ax1.set_title('individual devices')
-    ax2.set_title('all devices box plot')
-    ax3.set_title('relative change distribution')
-    ax4.set_title('absolute change distribution')
-
-    # plot all
-    if plot_all_bool:
-        plot_all(df)
+def save_for_manual_plot(df, path, save=True, chunksize=None):
+    """One row per sweep number with the time and G of every device side by side, built with one reshape.
+    Devices with fewer sweeps (e.g. a stopped run) are padded with NaN.
+    With chunksize the table is written to disk in blocks of chunksize rows and None is returned,
+    so the wide table of a very long run never has to be in memory at once."""
+    device_list = df.device.unique()
+    row = df.groupby('device', sort=False).cumcount().rename('row')  # n-th sweep of each device
+    if chunksize is None:
+        df_plot = _manual_plot_table(df, device_list, row)
+        if save:
+            df_plot.to_csv(path + '/for_manual_plotting.csv')
+        return df_plot
+
+    order = np.argsort(row.to_numpy(), kind='stable')  # rows grouped by sweep number, sliced per chunk below
+    sorted_row = row.to_numpy()[order]
+    n_rows = int(sorted_row[-1]) + 1 if len(sorted_row) else 0
+    for start in range(0, max(n_rows, 1), chunksize):
+        chunk = order[np.searchsorted(sorted_row, start):np.searchsorted(sorted_row, start + chunksize)]
+        df_chunk = _manual_plot_table(df.iloc[chunk], device_list, row.iloc[chunk])
+        df_chunk.to_csv(path + '/for_manual_plotting.csv', mode='w' if start == 0 else 'a', header=start == 0)
+    return None
+
+
+def basic_stat_2seg(df, event_repeat=None, plot_all_bool=False, cutoff=0, n_resamples=10000, seed=None, n_jobs=1,
+                    save_as=None, close=False):
+    """Before/after statistics of the live devices around an event.
+    With event_repeat given, the sweeps of that repeat are dropped as the transition. With event_repeat=None
+    the event is found with changepoint.find_event_repeat and split there (after = from the change on, seed
+    passed on), a ValueError is raised if no significant common change is found.
+    Besides the paired t-test, bootstrap confidence intervals and permutation p-values of the mean relative and
+    absolute change are computed with n_resamples replicates (resampling.compare, seed and n_jobs passed on).
+    save_as: file the figure is saved to, close=True closes it afterwards (for batch rendering).
+    Returns the per device change points when detected, else None."""
+    with plt.style.context(STYLE):
+        centimeter = 1 / 2.54
+        fig1, ((ax1, ax2), (ax3, ax4)) = plt.subplots(ncols=2, nrows=2, figsize=(20 * centimeter, 20 * centimeter))
+        plt.subplots_adjust(left=None, bottom=0.2, right=None, top=None, wspace=None, hspace=None)
+        ax1.set_title('individual devices')
+        ax2.set_title('all devices box plot')
+        ax3.set_title('relative change distribution')
+        ax4.set_title('absolute change distribution')
+
+        # plot all
+        if plot_all_bool:
+            plot_all(df)
+
+        # drop dead devices
+        live_list, dead_list, device_stats = classify_devices(df, cutoff=cutoff)
+        print('dead devices are: ' + str(dead_list))
+        print('live devices are: ' + str(live_list))
+
+        df = df.loc[(df.device.isin(live_list))]
+
+        # split at event repeat
+        change_points = None
+        if event_repeat is None:
+            event_repeat, change_points = find_event_repeat(df, devices=live_list, seed=seed)
+            if event_repeat is None:
+                plt.close(fig1)
+                raise ValueError('no event detected in the live devices (too few repeats or no significant common '
+                                 'change), pass event_repeat to basic_stat_2seg')
+            print('detected event at repeat ' + str(event_repeat))
+            df_before = df[df.repeat < event_repeat]
+            df_after = df[df.repeat >= event_repeat]
+        else:
+            df_before = df[df.repeat < event_repeat]
+            df_after = df[df.repeat > event_repeat]
 
-    # drop dead devices
-    dead_list = get_dead_devices(df, cutoff=cutoff)
-    live_list = get_live_devices(df, cutoff=cutoff)
-    print('dead devices are: ' + str(dead_list))
-    print('live devices are: ' + str(live_list))
+        # get averages
+        df_G_before_av = get_G_average(df_before)
+        df_G_after_av = get_G_average(df_after)
+        df_for_box1 = pd.DataFrame({'before': list(df_G_before_av.G_mean), 'after': list(df_G_after_av.G_mean)})
 
-    df = df.loc[(df.device.isin(live_list))]
+        # paired t-test for G
+        tt = stats.ttest_rel(df_G_before_av.G_mean, df_G_after_av.G_mean)
+        print(tt)
 
-    # split at event repeat
-    df_before = df[df.repeat < event_repeat]
-    df_after = df[df.repeat > event_repeat]
+        # bootstrap intervals and permutation p-values of the changes
+        resampled = compare(df_G_before_av.G_mean, df_G_after_av.G_mean.reindex(df_G_before_av.index),
+                            n_resamples=n_resamples, seed=seed, n_jobs=n_jobs)
+        print(resampled)
 
-    # get averages
-    df_G_before_av = get_G_average(df_before)
-    df_G_after_av = get_G_average(df_after)
-    df_for_box1 = pd.DataFrame({'before': list(df_G_before_av.G_mean), 'after': list(df_G_after_av.G_mean)})
+        # error bar plot all
+        for device in live_list:
+            x = ['before', 'after']
+            y = [float(df_G_before_av.G_mean[device]), float(df_G_after_av.G_mean[device])]
+            yerr = [float(df_G_before_av.G_sterr[device]), float(df_G_after_av.G_sterr[device])]
+            ax1.errorbar(x, y, yerr=yerr)
 
-    # paired t-test for G
-    tt = stats.ttest_rel(df_G_before_av.G_mean, df_G_after_av.G_mean)
-    print(tt)
+        ax1.set_ylabel('G (S)')
 
-    # error bar plot all
-    for device in live_list:
+        # boxplot
         x = ['before', 'after']
-        y = [float(df_G_before_av.G_mean[device]), float(df_G_after_av.G_mean[device])]
-        yerr = [float(df_G_before_av.G_sterr[device]), float(df_G_after_av.G_sterr[device])]
-        ax1.errorbar(x, y, yerr=yerr)
-
-    ax1.set_ylabel('G (S)')
-
-    # boxplot
-    x = ['before', 'after']
-    ax2.boxplot(df_for_box1, showmeans=True)
-    ax2.set_xticklabels(labels=x)
-    ax2.set_ylabel('G (S)')
-
-    # relative hist
-    rel_diff = (df_G_after_av.G_mean - df_G_before_av.G_mean) / df_G_before_av.G_mean
-    ax3.hist(rel_diff, fc='lightcoral', ec='black')
-    ax3.set_xlabel(r'$(G_{after}-G_{after})/G_{before}$')
-    ax3.set_ylabel('number of devices')
-    ax3.axvline(rel_diff.mean(), color='k', linestyle='dashed', linewidth=1)
-
-    # absolute hist
-    abs_diff = (df_G_after_av.G_mean - df_G_before_av.G_mean)
-    ax4.hist(abs_diff, fc='cornflowerblue', ec='black')
-    ax4.set_xlabel(r'$G_{after}-G_{after}$')
-    ax4.set_ylabel('number of devices')
-    ax4.axvline(abs_diff.mean(), color='k', linestyle='dashed', linewidth=1)
-
-    add_text = ('Dead devices were removed. Dead device list: ' + str(dead_list) + '\n' +
-                'Total live devices: ' + str(len(live_list)) + '\n' +
-                'Paired T-test for live devices: test statistic = ' + '{:.2f}'.format(tt[0]) +
-                ' p-value =' + '{:.7f}'.format(tt[1]))
-    ax1.text(-0.2, -1.8, add_text, transform=ax1.transAxes)
+        ax2.boxplot(df_for_box1, showmeans=True)
+        ax2.set_xticklabels(labels=x)
+        ax2.set_ylabel('G (S)')
+
+        # relative hist
+        rel_diff = (df_G_after_av.G_mean - df_G_before_av.G_mean) / df_G_before_av.G_mean
+        ax3.hist(rel_diff, fc='lightcoral', ec='black')
+        ax3.set_xlabel(r'$(G_{after}-G_{after})/G_{before}$')
+        ax3.set_ylabel('number of devices')
+        ax3.axvline(rel_diff.mean(), color='k', linestyle='dashed', linewidth=1)
+
+        # absolute hist
+        abs_diff = (df_G_after_av.G_mean - df_G_before_av.G_mean)
+        ax4.hist(abs_diff, fc='cornflowerblue', ec='black')
+        ax4.set_xlabel(r'$G_{after}-G_{after}$')
+        ax4.set_ylabel('number of devices')
+        ax4.axvline(abs_diff.mean(), color='k', linestyle='dashed', linewidth=1)
+
+        add_text = ('Dead devices were removed. Dead device list: ' + str(dead_list) + '\n' +
+                    'Total live devices: ' + str(len(live_list)) + '\n' +
+                    'Event repeat' + (' (detected)' if change_points is not None else '') + ': ' +
+                    str(event_repeat) + '\n' +
+                    'Paired T-test for live devices: test statistic = ' + '{:.2f}'.format(tt[0]) +
+                    ' p-value =' + '{:.7f}'.format(tt[1]) + '\n' +
+                    'Mean relative change = ' + '{:.3E}'.format(resampled.estimate['relative']) +
+                    ' (95% CI ' + '{:.3E}'.format(resampled.ci_low['relative']) + ' to ' +
+                    '{:.3E}'.format(resampled.ci_high['relative']) + ', permutation p = ' +
+                    '{:.4f}'.format(resampled.p_value['relative']) + ')\n' +
+                    'Mean absolute change = ' + '{:.3E}'.format(resampled.estimate['absolute']) +
+                    ' S (95% CI ' + '{:.3E}'.format(resampled.ci_low['absolute']) + ' to ' +
+                    '{:.3E}'.format(resampled.ci_high['absolute']) + ', permutation p = ' +
+                    '{:.4f}'.format(resampled.p_value['absolute']) + ')')
+        ax1.text(-0.2, -1.8, add_text, transform=ax1.transAxes)
+        if save_as is not None:
+            fig1.savefig(save_as)
+    if close:
+        plt.close(fig1)
+    return change_points
 
 
 if __name__ == "__main__":
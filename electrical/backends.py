@@ -0,0 +1,267 @@
+"""
+Instrument backends for measurement.micr_measure. A backend bundles everything the measurement loop talks to:
+    clock          time(), sleep() and now() of the run
+    mux            multiplexer with the PiMUX interface (TruthTable, setMuxToOutput, switchReport)
+    target_array   the V_SD sweep array
+    connect        sets up the instruments, called with the run folder
+    prepare        called with the results table (holding the checkpointed rows when resuming) and the t0 its
+                   time column counts from
+    read           one reading of the DAQ input, used for settle detection
+    sweep          one IV sweep on the connected device, returns (ID, V_SD, I_SD)
+    close          called at the end of the run
+LabBackend drives the NI DAQ through pyneMeas and the Raspberry Pi MUX (imported only when it connects).
+SimBackend simulates both, so the production loop runs on any machine: with a FakeClock every wait is skipped and
+a run takes as long as the computation, with a Clock it runs in real time.
+"""
+import time
+import numpy as np
+from collections import Counter
+from datetime import datetime, timedelta
+from pi_control import PiMUX, TRUTH_TABLE
+from simulation_utils import make_rng, generate_data, generate_IV
+from settle import daq_resolution
+
+
+class Clock:
+    """Wall clock."""
+
+    def time(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def now(self):
+        return datetime.now()
+
+
+class FakeClock(Clock):
+    """Clock that only moves when something sleeps on it: sleep(s) adds s and returns at once."""
+
+    def __init__(self, start=None):
+        self.start = time.time() if start is None else start
+        self.t = self.start
+        self.slept = 0.0
+
+    def time(self):
+        return self.t
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.t += seconds
+            self.slept += seconds
+
+    def now(self):
+        return datetime.fromtimestamp(self.start) + timedelta(seconds=self.t - self.start)
+
+    def advance_to(self, t):
+        """Moves the clock forward to t (never back), without counting it as slept."""
+        self.t = max(self.t, t)
+
+
+def sweep_array(start_end_step):
+    """[start, end, step] -> sweep from start to end and back in steps of step, like U.targetArray."""
+    start, end, step = start_end_step
+    n = int(round(abs(end - start) / step)) + 1
+    out = np.linspace(start, end, n)
+    return np.concatenate([out, out[-2::-1]])
+
+
+class _SimPigpio:
+    """Stands in for the pigpio connection behind PiMUX bank writes. Every call costs latency on the clock."""
+
+    def __init__(self, clock, latency):
+        self.clock = clock
+        self.latency = latency
+        self.levels = 0  # GPIO levels as a bitmask
+        self.calls = 0
+
+    def clear_bank_1(self, bits):
+        self.clock.sleep(self.latency)
+        self.levels &= ~bits
+        self.calls += 1
+
+    def set_bank_1(self, bits):
+        self.clock.sleep(self.latency)
+        self.levels |= bits
+        self.calls += 1
+
+
+class _SimFactory:
+    def __init__(self, connection):
+        self.connection = connection
+
+
+class SimMUX(PiMUX):
+    """PiMUX on simulated GPIO pins. Switching runs the real bank write path of PiMUX.setMuxToOutput,
+    switch_latency is the time one pigpio round trip takes. Switches are timed on clock, so switchReport shows the
+    simulated latency on a FakeClock."""
+
+    def __init__(self, switch_latency=0.0, clock=None):
+        self.IP = 'simulated'
+        self.clock = Clock() if clock is None else clock
+        self.PiFactory = _SimFactory(_SimPigpio(self.clock, switch_latency))
+        self.TruthTable = dict(TRUTH_TABLE)
+        self.setupMasks(bank_write=True, timer=self.clock.time)  # switch times in the time of the clock
+        self._outputs = {mask: output for output, mask in self.masks.items()}
+        self.switched_at = self.clock.time()
+
+    def setMuxToOutput(self, desiredOutput):
+        PiMUX.setMuxToOutput(self, desiredOutput)
+        self.switched_at = self.clock.time()
+
+    @property
+    def output(self):
+        """Output selected by the levels on the pins (None if they match no row of the truth table)."""
+        return self._outputs.get(self.PiFactory.connection.levels)
+
+
+class SimBackend:
+
+    def __init__(self, device_list, G=None, repeats=10, event_repeat=5, seed=None, clock=None,
+                 switch_latency=0.0, point_time=1e-3, transient=1e-5, settle_tau=0.0, gain=1E3, read_noise=1.0):
+        """Simulated DAQ and MUX for the devices in device_list.
+        G is a device x repeat matrix of conductances (rows in the order of device_list), generated with
+        simulation_utils.generate_data(repeats, event_repeat) if not given. Each sweep of a device takes the next
+        G of its row (the last one once the row is used up), outputs that are not in device_list are open. The
+        currents are generated lazily one repeat at a time, all rows at once (simulation_utils.generate_IV), so
+        only the repeats in progress are held in memory.
+        clock: FakeClock (default, no waiting) or Clock (real time). switch_latency: time per MUX bank write.
+        point_time: time per sweep point. transient, settle_tau: the DAQ input after a switch decays
+        from transient (A) with time constant settle_tau (s), seen by settle detection. Readings are quantised to the
+        ADC code of the DAQ at preamp gain (settle.daq_resolution) with read_noise codes of Gaussian noise."""
+        self.clock = FakeClock() if clock is None else clock
+        self.rng = make_rng(seed)
+        if G is None:
+            G = generate_data(device_list=device_list, repeats=repeats, event_repeat=event_repeat, seed=self.rng)
+        self.G = {device: np.atleast_1d(np.asarray(row, dtype=np.float64)) for device, row in zip(device_list, G)}
+        self.switch_latency = switch_latency
+        self.point_time = point_time
+        self.transient = transient
+        self.settle_tau = settle_tau
+        self.resolution = daq_resolution(gain)
+        self.read_noise = read_noise
+        self.mux = SimMUX(switch_latency, self.clock)
+        self.counts = {}  # sweeps taken per device
+        self.ID = 0
+        self.V_SD = None
+        self.I = {}  # repeat -> {device: V_SD currents}, only the repeats in progress
+
+    def target_array(self, start_end_step):
+        self.V_SD = sweep_array(start_end_step)
+        self.I = {}
+        return self.V_SD
+
+    def connect(self, basePath, fileName):
+        pass
+
+    def prepare(self, results, t0):
+        n = len(results)
+        self.counts = dict(Counter(results.device[:n].tolist()))
+        self.ID = int(results.ID[n - 1]) if n else 0
+        if n and isinstance(self.clock, FakeClock):
+            # a resumed run goes on from the end of the last checkpointed sweep
+            self.clock.advance_to(t0 + float(results.time[n - 1]) + self.point_time * len(self.V_SD))
+
+    def _conductance(self, device):
+        row = self.G.get(device)
+        if row is None:
+            return 0.0
+        return row[min(self.counts.get(device, 0), len(row) - 1)]
+
+    def _repeat(self, repeat):
+        """Currents of all rows that reach repeat, generated in one call the first time a device gets there.
+        Repeats that every row has passed are dropped."""
+        block = self.I.get(repeat)
+        if block is None:
+            devices = [device for device, row in self.G.items() if repeat < len(row)]
+            G = [self.G[device][repeat] for device in devices]
+            block = dict(zip(devices, generate_IV(G, self.V_SD, seed=self.rng)))
+            done = min((self.counts.get(device, 0) for device in self.G), default=0)
+            self.I = {r: b for r, b in self.I.items() if r >= done}
+            self.I[repeat] = block
+        return block
+
+    def _current(self, device, V_SD):
+        """Sweep of device from the block of its repeat, or a new one for open outputs, used up rows and
+        other V_SD."""
+        row = self.G.get(device)
+        count = self.counts.get(device, 0)
+        if row is not None and count < len(row) and V_SD.shape == self.V_SD.shape and np.array_equal(V_SD, self.V_SD):
+            return self._repeat(count)[device]
+        return generate_IV(self._conductance(device), V_SD, seed=self.rng)
+
+    def read(self):
+        signal = 0.0
+        if self.settle_tau > 0:
+            dt = self.clock.time() - self.mux.switched_at
+            signal = self.transient * np.exp(-dt / self.settle_tau)
+        codes = signal / self.resolution + self.read_noise * self.rng.standard_normal()
+        return float(np.round(codes)) * self.resolution
+
+    def sweep(self, V_SD):
+        device = self.mux.output
+        V_SD = np.asarray(V_SD, dtype=np.float64)
+        self.clock.sleep(self.point_time * len(V_SD))
+        I_SD = self._current(device, V_SD)
+        self.counts[device] = self.counts.get(device, 0) + 1
+        self.ID += 1
+        return self.ID, V_SD, I_SD
+
+    def close(self):
+        pass
+
+
+class LabBackend:
+
+    def __init__(self, Pi_IP_address='129.94.163.203', currentVoltagePreAmp_gain=1E3, usbPort='Dev2'):
+        """NI USB-6216 through pyneMeas (output 0, input 2 through the current preamp) and the PiMUX."""
+        self.Pi_IP_address = Pi_IP_address
+        self.gain = currentVoltagePreAmp_gain
+        self.usbPort = usbPort
+        self.clock = Clock()
+        self.mux = None
+
+    def target_array(self, start_end_step):
+        import pyneMeas.utility as U
+
+        start_sd, end_sd, step_sd = start_end_step
+        return U.targetArray([start_sd, end_sd, start_sd], stepsize=step_sd)
+
+    def connect(self, basePath, fileName):
+        import pyneMeas.Instruments as I
+
+        self.mux = PiMUX(IP=self.Pi_IP_address)  # sets up raspberry pi
+
+        self.daqout_S = I.USB6216Out(0, usbPort=self.usbPort)  # sets up NIDAQ
+        self.daqout_S.setOptions({
+            "feedBack": "Int",
+            "extPort": 6,  # Can be any number 0-7 if in 'Int'
+            "scaleFactor": 1
+        })
+        self.daqin_D = I.USB6216In(2, usbPort=self.usbPort)  # sets up NIDAQ
+        self.daqin_D.set('scaleFactor', self.gain)  # sets up NIDAQ to work with the current preamp
+
+        myTime = I.TimeMeas()  # gets time
+        self.Dct = {}  # sets up IV sweep including where to save the files
+        self.Dct['basePath'] = basePath + '/IV'
+        self.Dct['fileName'] = fileName
+        self.Dct['setters'] = {self.daqout_S: 'V_SD'}
+        self.Dct['readers'] = {myTime: 'time',
+                               self.daqin_D: 'I_SD'}
+
+    def prepare(self, results, t0):
+        pass
+
+    def read(self):
+        return self.daqin_D.read()
+
+    def sweep(self, V_SD):
+        import pyneMeas.utility as U
+
+        self.Dct['sweepArray'] = V_SD
+        df = U.sweep(self.Dct)  # Perform IV sweep using the NIDAQ pyne module
+        return U.readCurrentID(), df['V_SD'].to_numpy(), df['I_SD'].to_numpy()
+
+    def close(self):
+        pass
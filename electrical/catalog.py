@@ -0,0 +1,148 @@
+"""
+Catalog of measurement run folders. Every folder with a comments.txt (as written by micr_measure) is a run;
+its metadata (file name, start, repeats, preamp gain, IV sweep range, device type, comment) is parsed from
+comments.txt. Result tables are only read when needed and aggregates across runs are computed chunk by chunk
+with running_stats.RunningStats, so memory does not grow with the number or length of the runs.
+"""
+import ast
+import os
+import pandas as pd
+from pathlib import Path
+from running_stats import RunningStats
+
+SCALAR_COLUMNS = ['ID', 'repeat', 'time', 'device', 'G', 'std_err']
+
+
+def parse_comments(path):
+    """Metadata from a comments.txt. Resumed runs append a second header, the first one is used."""
+    meta = {}
+    keys = {'start': 'start', 'Filename': 'fileName', 'repeats': 'repeats', 'Preamp gain': 'gain',
+            'IV start, stop, step': 'sweep', 'device type': 'device_type', 'comment': 'comment'}
+    with open(path, 'r') as f:
+        for line in f:
+            for sep in (' = ', ': '):
+                key, found, value = line.partition(sep)
+                if found and key.strip() in keys and keys[key.strip()] not in meta:
+                    meta[keys[key.strip()]] = value.strip()
+                    break
+    if 'repeats' in meta:
+        meta['repeats'] = int(meta['repeats'])
+    if 'gain' in meta:
+        meta['gain'] = float(meta['gain'])
+    if 'sweep' in meta:
+        meta['sweep'] = ast.literal_eval(meta['sweep'])
+    if 'start' in meta:
+        meta['start'] = pd.Timestamp(meta['start'])
+    return meta
+
+
+class Run:
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.name = self.path.name
+        self.meta = parse_comments(self.path / 'comments.txt')
+        if 'device_type' not in self.meta and (self.path / 'testchip_summary.txt').exists():
+            with open(self.path / 'testchip_summary.txt', 'r') as f:  # written by analysis.check_values
+                for line in f:
+                    if line.startswith('type: '):
+                        self.meta['device_type'] = line[len('type: '):].strip()
+                        break
+        self.master_path = self._find_master()
+
+    def _find_master(self):
+        if 'fileName' in self.meta and (self.path / (self.meta['fileName'] + '.csv')).exists():
+            return self.path / (self.meta['fileName'] + '.csv')
+        if 'fileName' in self.meta and (self.path / (self.meta['fileName'] + '_checkpoint.csv')).exists():
+            return self.path / (self.meta['fileName'] + '_checkpoint.csv')  # run that never finished
+        return None
+
+    def __repr__(self):
+        return 'Run(' + repr(str(self.path)) + ')'
+
+    def load(self, columns=SCALAR_COLUMNS):
+        """Reads the run's result table. The raw sweep columns are skipped unless asked for."""
+        return pd.read_csv(self.master_path, usecols=lambda c: c in columns)
+
+    def iter_chunks(self, chunksize=100000, columns=SCALAR_COLUMNS):
+        return pd.read_csv(self.master_path, usecols=lambda c: c in columns, chunksize=chunksize)
+
+    def device_csvs(self):
+        return sorted((self.path / 'devices').glob('*_device_*.csv'))
+
+
+class RunCatalog:
+
+    def __init__(self, root):
+        """Indexes every run folder below root. Only comments.txt is read here."""
+        self.root = Path(root)
+        self.runs = []
+        for folder, dirs, files in os.walk(self.root):
+            if 'comments.txt' in files:
+                run = Run(folder)
+                if run.master_path is not None:
+                    self.runs.append(run)
+                dirs[:] = [d for d in dirs if d not in ('devices', 'IV')]
+        self.runs.sort(key=lambda run: str(run.path))
+
+    def __len__(self):
+        return len(self.runs)
+
+    def __iter__(self):
+        return iter(self.runs)
+
+    def __getitem__(self, name):
+        for run in self.runs:
+            if run.name == name:
+                return run
+        raise KeyError(name)
+
+    def to_frame(self):
+        """Metadata of all runs, one row per run."""
+        rows = [dict(run=run.name, path=str(run.path), **run.meta) for run in self.runs]
+        return pd.DataFrame(rows).set_index('run') if rows else pd.DataFrame()
+
+    def select(self, **criteria):
+        """Runs whose metadata match all criteria, e.g. select(device_type='top', gain=1E3)."""
+        return [run for run in self.runs if all(run.meta.get(key) == value for key, value in criteria.items())]
+
+    def _key(self, run, by):
+        if by is None:
+            return None
+        if by == 'run':
+            return run.name
+        return run.meta.get(by)
+
+    def accumulate(self, by='run', runs=None, chunksize=100000):
+        """RunningStats per group, reading every run in chunks. by is 'run', a metadata key
+        (e.g. 'device_type') or None for one group over all runs."""
+        groups = {}
+        for run in self.runs if runs is None else runs:
+            stats = groups.setdefault(self._key(run, by), RunningStats())
+            for chunk in run.iter_chunks(chunksize, columns=['device', 'G']):
+                stats.update_many(chunk['device'], chunk['G'])
+        return groups
+
+    def device_stats(self, by='run', runs=None, chunksize=100000):
+        """G_mean, G_std, G_sterr and n per group and device, like analysis.get_G_average across runs."""
+        groups = self.accumulate(by=by, runs=runs, chunksize=chunksize)
+        frames = {key: stats.to_frame(counts=True) for key, stats in groups.items()}
+        if by is None:
+            return frames[None] if frames else pd.DataFrame()
+        return pd.concat(frames, names=[by]) if frames else pd.DataFrame()
+
+    def chip_stats(self, by='run', runs=None, cutoff=5e-6, chunksize=100000):
+        """One row per chip (group): number of devices, live devices (mean G above cutoff), mean and spread of
+        the live device means and the mean noise (G_std) of the live devices."""
+        dfs = self.device_stats(by=by, runs=runs, chunksize=chunksize)
+        if len(dfs) == 0:
+            return pd.DataFrame()
+        live = dfs[dfs.G_mean > cutoff]
+        chips = pd.DataFrame({'n_devices': dfs.groupby(level=0).size(),
+                              'n_sweeps': dfs.groupby(level=0)['n'].sum(),
+                              'n_live': live.groupby(level=0).size()})
+        chips['n_live'] = chips['n_live'].fillna(0).astype(int)
+        chips['G_mean_live'] = live.groupby(level=0)['G_mean'].mean()
+        chips['G_spread_live'] = live.groupby(level=0)['G_mean'].std()
+        chips['G_std_live'] = live.groupby(level=0)['G_std'].mean()
+        return chips
@@ -0,0 +1,152 @@
+"""
+Change-point detection for the G traces of a run, used to find the event repeat of analysis.basic_stat_2seg.
+All devices are handled at once on the device x repeat matrix of G: for every possible split the within-segment
+sum of squares (L2 cost) of both segments is computed from cumulative sums, and the split with the largest cost
+reduction is the change point of that device. The consensus change point maximises the cost reduction summed
+over all devices, each normalised by its total sum of squares so bright and dim devices count the same.
+It is only reported if it beats the best consensus split of the same matrix with its repeats shuffled
+(permutation test), so pure noise gives no event. The permutations are drawn and scanned in blocks with array
+operations, each block from its own child of one SeedSequence like resampling.py.
+"""
+import numpy as np
+import pandas as pd
+from simulation_utils import make_seed_sequence
+
+PERMUTATION_BLOCK = 2 ** 21  # matrix elements (devices x repeats x permutations) scanned at once
+
+
+def G_matrix(df, devices=None):
+    """Mean G per device (rows) and repeat (columns). Missing sweeps are NaN."""
+    if devices is not None:
+        df = df[df.device.isin(devices)]
+    return df.pivot_table(index='device', columns='repeat', values='G', aggfunc='mean').sort_index(axis=1)
+
+
+def split_gains(G, min_size=2):
+    """Cost reduction of splitting each row of G before column k, for k = 0 .. n_repeats (columns where a split
+    leaves fewer than min_size sweeps on one side are NaN). Returns (gains, total sum of squares per row)."""
+    G = np.asarray(G, dtype=np.float64)
+    valid = ~np.isnan(G)
+    with np.errstate(invalid='ignore'):
+        centred = np.where(valid, G - np.nanmean(G, axis=1, keepdims=True), 0.0)  # keeps the sums well conditioned
+    zeros = np.zeros((G.shape[0], 1))
+    C = np.hstack([zeros, np.cumsum(valid, axis=1)])
+    S = np.hstack([zeros, np.cumsum(centred, axis=1)])
+    Q = np.hstack([zeros, np.cumsum(centred ** 2, axis=1)])
+    C_tot, S_tot, Q_tot = C[:, -1:], S[:, -1:], Q[:, -1:]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sse_tot = Q_tot - S_tot ** 2 / C_tot
+        sse_left = Q - S ** 2 / C
+        sse_right = (Q_tot - Q) - (S_tot - S) ** 2 / (C_tot - C)
+        gains = sse_tot - sse_left - sse_right
+    gains[(C < min_size) | (C_tot - C < min_size)] = np.nan
+    return gains, sse_tot[:, 0]
+
+
+def detect_change_points(G, min_size=2, n_permutations=199, alpha=0.01, seed=0):
+    """Single change point per device of a G matrix (DataFrame from G_matrix, or array with repeats 0..n-1).
+    Returns (per_device, consensus): per_device is indexed by device with change_repeat (first repeat after the
+    change), gain (cost reduction), score (gain / total sum of squares, 0..1), G_before, G_after and rel_change;
+    consensus is the change repeat shared by all devices. consensus is None if no split is possible or if the
+    mean normalised gain of the consensus split is not significant: its permutation p-value over n_permutations
+    shuffles of the repeat order (the same shuffle for all devices, seeded with seed) has to be at most alpha.
+    n_permutations=0 skips the test."""
+    if isinstance(G, pd.DataFrame):
+        devices, repeats, values = G.index, np.asarray(G.columns), G.to_numpy(dtype=np.float64)
+    else:
+        values = np.atleast_2d(np.asarray(G, dtype=np.float64))
+        devices, repeats = pd.RangeIndex(values.shape[0], name='device'), np.arange(values.shape[1])
+
+    gains, sse_tot = split_gains(values, min_size)
+    usable = ~np.all(np.isnan(gains), axis=1)
+    k = np.zeros(len(values), dtype=np.int64)
+    k[usable] = np.nanargmax(gains[usable], axis=1)
+    rows = np.arange(len(values))
+    gain = np.where(usable, gains[rows, k], np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        score = np.where(sse_tot > 0, gain / sse_tot, 0.0)
+        normalised = gains / sse_tot[:, None]
+    normalised[~(sse_tot > 0)] = 0.0  # flat traces carry no information about the split
+
+    # mean G on either side of each device's own split
+    column = np.arange(values.shape[1])
+    valid = ~np.isnan(values)
+    is_before = column[None, :] < k[:, None]
+    filled = np.where(valid, values, 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        G_before = (filled * is_before).sum(axis=1) / (valid & is_before).sum(axis=1)
+        G_after = (filled * ~is_before).sum(axis=1) / (valid & ~is_before).sum(axis=1)
+    G_before[~usable] = np.nan
+    G_after[~usable] = np.nan
+
+    per_device = pd.DataFrame({'change_repeat': np.where(usable, repeats[np.minimum(k, len(repeats) - 1)], np.nan),
+                               'gain': gain,
+                               'score': np.where(usable, score, np.nan),
+                               'G_before': G_before,
+                               'G_after': G_after},
+                              index=devices)
+    per_device['rel_change'] = (per_device.G_after - per_device.G_before) / per_device.G_before
+
+    consensus = None
+    if usable.any():
+        total = _consensus_gain(normalised[usable])
+        best = int(np.nanargmax(total))
+        if n_permutations <= 0 or _permutation_p(values[usable], total[best], min_size, n_permutations,
+                                                 seed) <= alpha:
+            consensus = repeats[best]
+    return per_device, consensus
+
+
+def _consensus_gain(normalised):
+    """Normalised gain per split summed over the devices (NaN where no device can split)."""
+    total = np.nansum(normalised, axis=0)
+    total[np.all(np.isnan(normalised), axis=0)] = np.nan
+    return total
+
+
+def _best_consensus_gains(x, valid, flat, perms, min_size):
+    """Best consensus gain for each column order in perms (permutations x repeats). x holds the rows minus their
+    mean, divided by the square root of their total sum of squares (0 where not valid and for flat rows).
+    With the rows centred the normalised gain of a split reduces to S^2 * n / (C * (n - C)), S and C being the
+    cumulative sum and count before the split and n the count of the row, so one cumulative sum is enough when
+    nothing is missing (C is then the split position for every device)."""
+    S = np.cumsum(x[:, perms], axis=-1)[..., :-1]  # devices x permutations x splits 1 .. n_repeats - 1
+    if valid.all():
+        n = x.shape[1]
+        C = np.arange(1, n)
+        splits = (C >= min_size) & (n - C >= min_size)
+        total = np.einsum('dpk,dpk->pk', S, S) * (n / (C * (n - C)))
+        total[:, ~splits] = 0.0 if flat.any() else -np.inf  # flat rows count with gain 0 at every split
+        return total.max(axis=-1)
+    C = np.cumsum(valid[:, perms], axis=-1)[..., :-1]
+    n = valid.sum(axis=1)[:, None, None]
+    splits = (C >= min_size) & (n - C >= min_size)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        total = np.where(splits, S ** 2 * n / (C * (n - C)), 0.0).sum(axis=0)
+    total[~(splits | flat[:, None, None]).any(axis=0)] = -np.inf
+    return total.max(axis=-1)
+
+
+def _permutation_p(values, observed, min_size, n_permutations, seed):
+    """p-value of the best consensus gain observed against the best one with the repeats in random order."""
+    valid = ~np.isnan(values)
+    with np.errstate(invalid='ignore'):
+        centred = np.where(valid, values - np.nanmean(values, axis=1, keepdims=True), 0.0)
+    sse_tot = (centred ** 2).sum(axis=1)
+    flat = ~(sse_tot > 0)
+    x = centred / np.sqrt(np.where(flat, 1.0, sse_tot))[:, None]
+    size = max(1, PERMUTATION_BLOCK // values.size)
+    sizes = [size] * (n_permutations // size) + ([n_permutations % size] if n_permutations % size else [])
+    exceed = 0
+    for n, child in zip(sizes, make_seed_sequence(seed).spawn(len(sizes))):
+        perms = np.random.default_rng(child).permuted(np.tile(np.arange(values.shape[1]), (n, 1)), axis=1)
+        exceed += int(np.sum(_best_consensus_gains(x, valid, flat, perms, min_size) >= observed))
+    return (exceed + 1) / (n_permutations + 1)
+
+
+def find_event_repeat(df, devices=None, min_size=2, n_permutations=199, alpha=0.01, seed=0):
+    """Change points of the run in df (optionally only the given devices, e.g. the live ones).
+    Returns (consensus repeat, per_device table), see detect_change_points."""
+    per_device, consensus = detect_change_points(G_matrix(df, devices), min_size, n_permutations, alpha, seed)
+    return consensus, per_device
@@ -0,0 +1,102 @@
+"""
+Append-only checkpoint of a running measurement. Every completed repeat is appended to
+<fileName>_checkpoint.csv (scalar columns) and to the run's SweepStore (raw sweeps), so each write only costs
+the new rows. A crashed or stopped run can be reopened with Checkpoint.resume and continued where it stopped.
+"""
+import json
+import pandas as pd
+from pathlib import Path
+from results import ResultsBuffer, device_array
+from sweep_store import SweepStore, store_path
+
+SCALAR_COLUMNS = ['ID', 'repeat', 'time', 'datetime', 'device', 'G', 'std_err']
+
+
+class Checkpoint:
+
+    def __init__(self, basePath, fileName):
+        self.basePath = basePath
+        self.fileName = fileName
+        self.table_path = Path(basePath + '/' + fileName + '_checkpoint.csv')
+        self.state_path = Path(basePath + '/' + fileName + '_checkpoint.json')
+        self.store = None
+        self.t0 = None
+        self.written = 0
+
+    @classmethod
+    def start(cls, basePath, fileName, t0, n_points):
+        """Creates the checkpoint files of a new run. t0 is the time.time() the run's time column counts from."""
+        cp = cls(basePath, fileName)
+        cp.t0 = t0
+        cp.store = SweepStore.create(store_path(basePath, fileName), n_points)
+        pd.DataFrame(columns=SCALAR_COLUMNS).to_csv(cp.table_path, index=False)
+        with open(cp.state_path, 'w') as f:
+            json.dump({'t0': t0, 'n_points': int(n_points)}, f)
+        return cp
+
+    @classmethod
+    def resume(cls, basePath, fileName, n_points=None, deviceList=None):
+        """Reopens the checkpoint of a partial run. A crash in the middle of a write can leave the csv or the
+        sweep files a little longer than the other, both are cut back to the rows that made it into all of them.
+        With n_points (sweep length) and deviceList given, a ValueError is raised before anything is changed on
+        disk if the run was measured with another sweep length or on devices that are not in deviceList."""
+        cp = cls(basePath, fileName)
+        with open(cp.state_path, 'r') as f:
+            state = json.load(f)
+        table = pd.read_csv(cp.table_path)
+        if n_points is not None and int(n_points) != state['n_points']:
+            raise ValueError('cannot resume ' + fileName + ': the checkpoint has sweeps of ' + str(state['n_points']) +
+                             ' points, start_end_step gives ' + str(int(n_points)) + ' points')
+        if deviceList is not None:
+            devices = pd.unique(device_array(table.device.to_numpy())).tolist()
+            missing = [device for device in devices if device not in list(deviceList)]
+            if missing:
+                raise ValueError('cannot resume ' + fileName + ': checkpointed devices ' + str(missing) +
+                                 ' are not in deviceList')
+        cp.t0 = state['t0']
+        cp.store = SweepStore(store_path(basePath, fileName))
+        n = min(len(table), len(cp.store))
+        if len(table) > n:
+            table.iloc[:n].to_csv(cp.table_path, index=False)
+        row_bytes = cp.store.dtype.itemsize * cp.store.n_points
+        for name, width in (('ID', 8), ('V_SD', row_bytes), ('I_SD', row_bytes)):
+            with open(cp.store.path / (name + '.bin'), 'r+b') as f:
+                f.truncate(n * width)
+        cp.written = n
+        return cp
+
+    def write(self, results):
+        """Appends the rows of a ResultsBuffer that are not on disk yet."""
+        start, stop = self.written, len(results)
+        if stop == start:
+            return
+        rows = slice(start, stop)
+        results.to_dataframe(sweeps=False, start=start, stop=stop)[SCALAR_COLUMNS].to_csv(
+            self.table_path, mode='a', header=False, index=False)
+        self.store.append(results.ID[rows], results.V_SD[rows], results.I_SD[rows])
+        self.written = stop
+
+    def load(self, n_rows, features=False):
+        """Returns a ResultsBuffer (sized for n_rows sweeps in total) filled with the checkpointed rows.
+        features is passed on to the ResultsBuffer, the features are computed again from the sweeps."""
+        table = pd.read_csv(self.table_path, parse_dates=['datetime'])
+        n = len(table)
+        results = ResultsBuffer(max(n_rows, n), self.store.n_points, features=features)
+        columns = {name: table[name].to_numpy() for name in SCALAR_COLUMNS}
+        columns['datetime'] = table['datetime'].to_numpy().astype('datetime64[us]')
+        columns['V_SD'] = self.store.V_SD[:n]
+        columns['I_SD'] = self.store.I_SD[:n]
+        results.extend(columns)
+        return results
+
+    @staticmethod
+    def next_position(results, deviceList):
+        """(repeat, device index) the measurement continues from after the rows in results."""
+        if len(results) == 0:
+            return 0, 0
+        last_repeat = int(results.repeat[len(results) - 1])
+        last_device = results.device[len(results) - 1]
+        i = list(deviceList).index(last_device) + 1
+        if i == len(deviceList):
+            return last_repeat + 1, 0
+        return last_repeat, i
@@ -0,0 +1,178 @@
+"""
+Local stop/pause control for a running measurement, replacing the stop.txt on the shared drive.
+Commands:
+    stop    end the run after the device that is being measured
+    finish  end the run after the current repeat (what stop.txt used to do)
+    pause   hold the acquisition before the next device
+    resume  continue after a pause
+They can be sent from another terminal on the same machine with
+    python control.py stop
+(a UDP message to localhost), written into a local command file if one is given, or Ctrl+C in the console
+(first Ctrl+C = stop, second one interrupts immediately).
+"""
+import os
+import signal
+import socket
+import sys
+import threading
+
+DEFAULT_PORT = 50907
+COMMANDS = ('stop', 'finish', 'pause', 'resume')
+
+
+class RunControl:
+
+    def __init__(self, port=DEFAULT_PORT, command_file=None, handle_sigint=True, poll=0.2):
+        """port: localhost UDP port to listen on (None to disable). command_file: local file checked every poll
+        seconds for a command (None to disable). handle_sigint: Ctrl+C stops after the current device."""
+        self.port = port
+        self.command_file = command_file
+        self.handle_sigint = handle_sigint
+        self.poll = poll
+        self.stop_event = threading.Event()
+        self.finish_event = threading.Event()
+        self.running = threading.Event()
+        self.running.set()
+        self.reason = None
+        self._closing = threading.Event()
+        self._threads = []
+        self._old_sigint = None
+
+    def command(self, cmd, source='command'):
+        cmd = cmd.strip().lower()
+        if cmd not in COMMANDS:
+            print('unknown control command: ' + repr(cmd))
+            return
+        print('control: ' + cmd + ' (' + source + ')')
+        if cmd == 'stop':
+            self.reason = 'stop from ' + source
+            self.stop_event.set()
+            self.running.set()  # a paused run has to wake up to stop
+        elif cmd == 'finish':
+            self.reason = 'finish from ' + source
+            self.finish_event.set()
+            self.running.set()
+        elif cmd == 'pause':
+            self.running.clear()
+        elif cmd == 'resume':
+            self.running.set()
+
+    def start(self):
+        """Starts listening. Has to be called from the main thread if Ctrl+C should be handled."""
+        if self.port is not None:
+            self._start_thread(self._listen, self._bind())
+        if self.command_file is not None:
+            with open(self.command_file, 'w') as f:
+                f.write('')
+            self._start_thread(self._watch)
+        if self.handle_sigint and threading.current_thread() is threading.main_thread():
+            self._old_sigint = signal.signal(signal.SIGINT, self._on_sigint)
+        return self
+
+    def close(self):
+        self._closing.set()
+        for thread in self._threads:
+            thread.join()
+        if self._old_sigint is not None:
+            signal.signal(signal.SIGINT, self._old_sigint)
+            self._old_sigint = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _start_thread(self, target, *args):
+        thread = threading.Thread(target=target, args=args, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _bind(self):
+        """Binds the UDP socket on the calling thread. If the port is taken (e.g. by a second run) a free port is
+        used instead and self.port is set to it, so instructions() names the port of this run."""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.bind(('127.0.0.1', self.port))
+        except OSError as e:
+            sock.bind(('127.0.0.1', 0))
+            print('control port ' + str(self.port) + ' is in use (' + str(e) + '), listening on port ' +
+                  str(sock.getsockname()[1]) + ' instead')
+            self.port = sock.getsockname()[1]
+        return sock
+
+    def _listen(self, sock):
+        with sock:
+            sock.settimeout(self.poll)
+            while not self._closing.is_set():
+                try:
+                    data, address = sock.recvfrom(64)
+                except socket.timeout:
+                    continue
+                self.command(data.decode(errors='replace'), 'socket')
+
+    def _watch(self):
+        last_mtime = os.stat(self.command_file).st_mtime
+        while not self._closing.wait(self.poll):
+            try:
+                mtime = os.stat(self.command_file).st_mtime
+            except FileNotFoundError:
+                continue
+            if mtime != last_mtime:
+                last_mtime = mtime
+                with open(self.command_file, 'r') as f:
+                    cmd = f.read()
+                if cmd.strip():
+                    self.command(cmd, 'command file')
+
+    def _on_sigint(self, signum, frame):
+        signal.signal(signal.SIGINT, self._old_sigint)  # a second Ctrl+C interrupts right away
+        self._old_sigint = None
+        self.command('stop', 'Ctrl+C')
+
+    def wait_if_paused(self, stop_event=None):
+        """Blocks while the run is paused. Returns straight away if it is running or stopping, or once stop_event
+        (e.g. the pipeline's, set when a consumer fails) is set."""
+        while not self.running.wait(self.poll):
+            if stop_event is not None and stop_event.is_set():
+                return
+
+    def stopping(self):
+        """True once the run should end after the current device."""
+        return self.stop_event.is_set()
+
+    def finishing(self):
+        """True once the run should end after the current repeat."""
+        return self.finish_event.is_set() or self.stop_event.is_set()
+
+    def instructions(self):
+        if self.port is None:
+            if self.command_file is None:
+                return 'Ctrl+C stops after the current device.'
+            return ('To control the measurement write stop|finish|pause|resume into ' + self.command_file +
+                    '. Ctrl+C stops after the current device.')
+        text = 'To control the measurement run "python control.py stop|finish|pause|resume"'
+        if self.port != DEFAULT_PORT:
+            text += ' with --port ' + str(self.port)
+        if self.command_file is not None:
+            text += ', or write the command into ' + self.command_file
+        return text + '. Ctrl+C stops after the current device.'
+
+
+def send(cmd, port=DEFAULT_PORT):
+    """Sends a command to a RunControl listening on this machine."""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.sendto(cmd.encode(), ('127.0.0.1', port))
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    port = DEFAULT_PORT
+    if '--port' in args:
+        k = args.index('--port')
+        port = int(args[k + 1])
+        del args[k:k + 2]
+    if len(args) != 1 or args[0] not in COMMANDS:
+        print('usage: python control.py stop|finish|pause|resume [--port PORT]')
+        sys.exit(1)
+    send(args[0], port)
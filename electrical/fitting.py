@@ -0,0 +1,144 @@
+"""
+Closed form least squares fits for many IV sweeps at once. Gives the same numbers as scipy.stats.linregress,
+but for a whole (n_sweeps x n_points) array in one numpy pass.
+iv_features goes beyond the linear fit for the out-and-back sweeps of U.targetArray([start, end, start]).
+"""
+import numpy as np
+
+FEATURE_COLUMNS = ['G_fwd', 'G_rev', 'hysteresis_area', 'curvature', 'asymmetry', 'rectification']
+
+
+def fit_sweeps(x, y):
+    """Fits y = slope * x + intercept along the last axis.
+
+    x can be a single sweep array (shared by all sweeps) or have the same shape as y.
+    y can be a single sweep (n_points) or a 2-D array (n_sweeps x n_points).
+    Returns a dictionary with 'slope', 'intercept', 'r', 'std_err' and 'intercept_stderr'.
+    Like scipy.stats.linregress, the standard errors of a two point sweep (an exact fit) are 0.
+    For a single sweep the values are floats, otherwise arrays of length n_sweeps.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    x = np.asarray(x, dtype=np.float64)
+    single = y.ndim == 1
+    y = np.atleast_2d(y)
+    x = np.broadcast_to(x, y.shape)
+    n = y.shape[-1]
+
+    xmean = x.mean(axis=-1)
+    ymean = y.mean(axis=-1)
+    dx = x - xmean[:, None]
+    dy = y - ymean[:, None]
+    ssxm = np.einsum('ij,ij->i', dx, dx) / n
+    ssym = np.einsum('ij,ij->i', dy, dy) / n
+    ssxym = np.einsum('ij,ij->i', dx, dy) / n
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = ssxym / ssxm
+        r = ssxym / np.sqrt(ssxm * ssym)
+    r = np.where((ssxm == 0) | (ssym == 0), 0.0, np.clip(r, -1.0, 1.0))
+    intercept = ymean - slope * xmean
+
+    dof = n - 2
+    if dof == 0:
+        std_err = np.zeros_like(slope)
+    else:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            std_err = np.sqrt((1 - r ** 2) * ssym / ssxm / dof)
+    intercept_stderr = std_err * np.sqrt(ssxm + xmean ** 2)
+
+    fit = {'slope': slope, 'intercept': intercept, 'r': r,
+           'std_err': std_err, 'intercept_stderr': intercept_stderr}
+    if single:
+        fit = {key: float(value[0]) for key, value in fit.items()}
+    return fit
+
+
+def _masked_slope(x, y, mask):
+    """Least squares slope along the last axis using only the points where mask is True (NaN below 2 points)."""
+    n = mask.sum(axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        xmean = np.where(mask, x, 0.0).sum(axis=-1) / n
+        ymean = np.where(mask, y, 0.0).sum(axis=-1) / n
+        dx = np.where(mask, x - xmean[:, None], 0.0)
+        dy = np.where(mask, y - ymean[:, None], 0.0)
+        slope = np.einsum('ij,ij->i', dx, dy) / np.einsum('ij,ij->i', dx, dx)
+    return np.where(n >= 2, slope, np.nan)
+
+
+def iv_features(x, y):
+    """Nonlinear features of out-and-back IV sweeps, x and y shaped as for fit_sweeps.
+
+    The sweep is split at its turning point (largest distance from the first bias) into the forward and the
+    reverse branch. Returns a dictionary with
+        G_fwd, G_rev     slope of the forward and of the reverse branch
+        hysteresis_area  signed area enclosed by the out-and-back path, the integral of I dV (W)
+        curvature        quadratic coefficient of I = a V^2 + b V + c over the whole sweep (S/V)
+        asymmetry        (G_fwd - G_rev) / (G_fwd + G_rev)
+        rectification    slope for V > 0 over slope for V < 0 (NaN unless the sweep crosses zero bias)
+    For a single sweep the values are floats, otherwise arrays of length n_sweeps.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    x = np.asarray(x, dtype=np.float64)
+    single = y.ndim == 1
+    shared = x.ndim == 1 or x.shape[0] == 1
+    y = np.atleast_2d(y)
+    x = np.broadcast_to(x, y.shape)
+    column = np.arange(y.shape[-1])
+
+    turn = np.argmax(np.abs(x - x[:, :1]), axis=-1)
+    G_fwd = _masked_slope(x, y, column[None, :] <= turn[:, None])
+    G_rev = _masked_slope(x, y, column[None, :] >= turn[:, None])
+    area = 0.5 * np.einsum('ij,ij->i', y[:, 1:] + y[:, :-1], np.diff(x, axis=-1))
+    area = np.where(y.shape[-1] - turn >= 2, area, np.nan)  # no reverse branch, no loop
+
+    # quadratic fit on the bias scaled to [-1, 1] to keep the normal equations well conditioned
+    scale = np.abs(x).max(axis=-1)
+    scale = np.where(scale > 0, scale, 1.0)
+    u = x / scale[:, None]
+    powers = np.stack([u ** 2, u, np.ones_like(u)], axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if shared:  # one pseudo-inverse for all sweeps
+            curvature = y @ np.linalg.pinv(powers[0])[0] / scale ** 2
+            if np.linalg.matrix_rank(powers[0]) < 3:
+                curvature[:] = np.nan
+        else:
+            A = np.einsum('ijk,ijl->ikl', powers, powers)
+            b = np.einsum('ijk,ij->ik', powers, y)
+            solvable = np.linalg.matrix_rank(A) == 3
+            A[~solvable] = np.eye(3)
+            curvature = np.where(solvable, np.linalg.solve(A, b[..., None])[:, 0, 0] / scale ** 2, np.nan)
+        asymmetry = (G_fwd - G_rev) / (G_fwd + G_rev)
+        rectification = _masked_slope(x, y, x > 0) / _masked_slope(x, y, x < 0)
+
+    features = {'G_fwd': G_fwd, 'G_rev': G_rev, 'hysteresis_area': area, 'curvature': curvature,
+                'asymmetry': asymmetry, 'rectification': rectification}
+    if single:
+        features = {key: float(value[0]) for key, value in features.items()}
+    return features
+
+
+def parse_sweep_column(column):
+    """Turns a V_SD or I_SD column read back from a master csv (list reprs) into a 2-D array."""
+    text = ','.join(str(item).replace('[', '').replace(']', '') for item in column)
+    values = np.array(text.split(','), dtype=np.float64)
+    return values.reshape(len(column), -1)
+
+
+def refit(df, xVar='V_SD', yVar='I_SD'):
+    """Refits every sweep of a results table (MasterDF or compact form). Returns a copy of df with new G and
+    std_err columns."""
+    if 'sweeps' in df.attrs and 'sweep' in df:  # compact results table, see results.py
+        arrays = dict(zip(('V_SD', 'I_SD'), df.attrs['sweeps'].get(df['sweep'].to_numpy())))
+        x = arrays[xVar].astype(np.float64)
+        y = arrays[yVar].astype(np.float64)
+    elif len(df) and isinstance(df[xVar].iloc[0], str):
+        x = parse_sweep_column(df[xVar])
+        y = parse_sweep_column(df[yVar])
+    else:
+        x = np.array(list(df[xVar]), dtype=np.float64)
+        y = np.array(list(df[yVar]), dtype=np.float64)
+    fit = fit_sweeps(x, y)
+    df = df.copy()
+    df['G'] = fit['slope']
+    df['std_err'] = fit['std_err']
+    return df
@@ -1,27 +1,29 @@
-import pyneMeas.Instruments as I
-import pyneMeas.utility as U
-from pi_control import PiMUX
 import pandas as pd
 import time
 import matplotlib.pyplot as plt
-import easygui
-from datetime import datetime
 from pathlib import Path
-from matplotlib.pyplot import cm
-import numpy as np
 import analysis
-from scipy import stats
+from results import ResultsBuffer, memory_report
+from checkpoint import Checkpoint
+from pipeline import SweepPipeline
+from control import RunControl, DEFAULT_PORT
+from settle import SettleDetector, default_tol_abs
+from scan_order import scan_order
+from running_stats import RunningStats
+from backends import LabBackend
+import fitting
 
 
 def fit_for_Master(df, xVar='V_SD', yVar='I_SD'):
-    slope, intercept, r_value, p_value, std_err = stats.linregress(df[xVar], df[yVar])
-    return {'G': [slope], 'std_err': [std_err]}
+    fit = fitting.fit_sweeps(df[xVar], df[yVar])
+    return {'G': [fit['slope']], 'std_err': [fit['std_err']]}
 
 
 def merge_df(Params, Fit, Master):
+    """Appends one sweep to a DataFrame. Copies the whole table, use results.ResultsBuffer in measurement loops."""
     Params.update(Fit)
     DF = pd.DataFrame(Params)
-    Master = Master.append(DF, ignore_index=True)
+    Master = pd.concat([Master, DF], ignore_index=True)
     return Master
 
 
@@ -33,121 +35,194 @@ def micr_measure(deviceList=[i for i in range(1, 47)],
                  start_end_step=[0, -0.5, 0.1],
                  comment='no comment',
                  testSample='no',
-                 plot_speed=1
+                 device_type='unknown',
+                 plot_interval=1.0,
+                 resume=False,
+                 control_port=DEFAULT_PORT,
+                 control_file=None,
+                 settle='fixed',
+                 settle_time=0.5,
+                 settle_tol_abs=None,
+                 settle_tol_rel=0.01,
+                 settle_window=3,
+                 optimise_order=False,
+                 iv_features=False,
+                 backend=None,
+                 basePath=None,
+                 plot=True,
+                 cutoff=1E-5
                  ):
-
-    stop_text = """If you want to shut down the program early, 
-    go to G:\\Shared drives\\Nanoelectronics Team Drive\\Data\\2021\\Marta\\Stop button 
-    open the \'stop\' file and replace this text with \'stop\'. Then save and close the file. 
-    The program will shut down when it finishes the current repeat."""
-
-    with open('G:/Shared drives/Nanoelectronics Team Drive/Data/2021/Marta/Stop button/stop.txt', 'w') as f:
-        f.write(stop_text)
-
-    start_sd = start_end_step[0]
-    end_sd = start_end_step[1]
-    step_sd = start_end_step[2]
-    V_SD = U.targetArray([start_sd, end_sd, start_sd],
-                         stepsize=step_sd)  # creates array of V_sd value for voltage sweep
+    """settle='fixed' waits settle_time after every MUX switch. settle='adaptive' samples the DAQ input until
+    the switching transient has settled (at most settle_time) and reuses the learned time per device: settled once
+    the last settle_window readings spread by less than settle_tol_abs + settle_tol_rel * |mean|, settle_tol_abs is
+    three ADC codes at currentVoltagePreAmp_gain if None (settle.default_tol_abs).
+    The run is controlled with control.py (stop, finish, pause, resume) over localhost UDP on control_port,
+    through a local command file control_file, or Ctrl+C.
+    optimise_order=True measures the devices in the order with the fewest MUX pin toggles (scan_order),
+    the results are still keyed by device.
+    iv_features=True adds the branch conductances, hysteresis area, curvature, asymmetry and rectification of
+    every sweep (fitting.iv_features) to the results table next to G.
+    backend: the instruments (backends.py), by default the DAQ and Pi MUX of the lab (LabBackend); a
+    backends.SimBackend runs the same loop without hardware. basePath: folder the data is saved in, asked for
+    with a dialog if None. plot=False runs without the live plot window and only saves the summary figure.
+    cutoff: G below which analysis.plot_all counts a device as dead."""
+    if backend is None:
+        backend = LabBackend(Pi_IP_address, currentVoltagePreAmp_gain)
+    clock = backend.clock
+
+    V_SD = backend.target_array(start_end_step)  # creates array of V_sd value for voltage sweep
 
     delay = 0  # USER INPUT delay between sets of IV measurements - measure all devices -> delay -> measure all devices
-    basePath = easygui.diropenbox().replace('\\', '/')  # opens window to select folder for data to be saved
+    if basePath is None:
+        import easygui
+        basePath = easygui.diropenbox().replace('\\', '/')  # opens window to select folder for data to be saved
+    if resume:  # checks the checkpoint matches this call before anything is written or connected
+        checkpoint = Checkpoint.resume(basePath, fileName, len(V_SD), deviceList)
 
     add_legend = True
 
-    with open(basePath + '/comments.txt', 'w') as f:
-        f.write('start: ' + str(datetime.now()) + '\n' +
+    with open(basePath + '/comments.txt', 'a' if resume else 'w') as f:
+        f.write(('\n\n---------resumed---------\n' if resume else '') +
+                'start: ' + str(clock.now()) + '\n' +
                 'Filename: ' + fileName + '\n' +
                 'Pi IP: ' + Pi_IP_address + '\n' +
                 'repeats = ' + str(repeats) + '\n' +
                 'Pi_IP_address = ' + Pi_IP_address + '\n' +
                 'Preamp gain = ' + str(currentVoltagePreAmp_gain) + '\n' +
                 'IV start, stop, step = ' + str(start_end_step) + '\n' +
+                'device type = ' + device_type + '\n' +
                 'data at: ' + basePath + '\n \n' +
                 'comment = ' + comment + '\n \n'
                 )
 
     # 2.Define device/instruments
-    my_Pi = PiMUX(IP=Pi_IP_address)  # sets up raspberry pi
-
-    daqout_S = I.USB6216Out(0, usbPort='Dev2')  # sets up NIDAQ
-    daqout_S.setOptions({
-        "feedBack": "Int",
-        "extPort": 6,  # Can be any number 0-7 if in 'Int'
-        "scaleFactor": 1
-    })
-    daqin_D = I.USB6216In(2, usbPort='Dev2')  # sets up NIDAQ
-    daqin_D.set('scaleFactor', currentVoltagePreAmp_gain)  # sets up NIDAQ to work with the current preamp
+    backend.connect(basePath, fileName)  # sets up raspberry pi and NIDAQ
+    my_Pi = backend.mux
 
     my_Pi.setMuxToOutput(0)  # sets multiplexer to state with all outputs off
 
-    myTime = I.TimeMeas()  # gets time
-    Dct = {}  # sets up IV sweep including where to save the files
-    Dct['basePath'] = basePath + '/IV'
-    Dct['fileName'] = fileName
-    Dct['setters'] = {daqout_S: 'V_SD'}
-    Dct['readers'] = {myTime: 'time',
-                      daqin_D: 'I_SD'}
-    Dct['sweepArray'] = V_SD
-
-    MasterDF = pd.DataFrame(
-        columns=['ID', 'repeat', 'time', 'datetime', 'device', 'V_SD', 'I_SD', 'G', 'std_err'])  # Sets up results table
-    t0 = time.time()  # gets time
+    if optimise_order:
+        scanList = scan_order(deviceList, my_Pi.TruthTable)  # order the devices are measured in
+    else:
+        scanList = list(deviceList)
+
+    if settle_tol_abs is None:
+        settle_tol_abs = default_tol_abs(currentVoltagePreAmp_gain)
+    if settle == 'adaptive':
+        settle_detector = SettleDetector(backend.read, timeout=settle_time, window=settle_window,
+                                         tol_rel=settle_tol_rel, tol_abs=settle_tol_abs, clock=clock)
+    else:
+        settle_detector = None
+
+    if resume:  # continue a stopped or crashed run from its checkpoint
+        # Sets up results table with the rows already measured
+        results = checkpoint.load(len(deviceList) * repeats, features=iv_features)
+        t0 = checkpoint.t0  # keeps the time base of the original run
+    else:
+        results = ResultsBuffer(len(deviceList) * repeats, len(V_SD), features=iv_features)  # Sets up results table
+        t0 = clock.time()  # gets time
+        checkpoint = Checkpoint.start(basePath, fileName, t0, len(V_SD))  # append-only copy of the results on disk
+    first_repeat, first_index = Checkpoint.next_position(results, scanList)
+    backend.prepare(results, t0)
 
     # Starting the measurement
-    addlegend = True  # variable used to make sure the legend only gets added once to realtime plot
-    linestyles = ['-', '--', '-.', ':']  # list used to altenate between line styles for different devices
-    centimetre = 1 / 2.54
-    color = iter(cm.tab20(np.linspace(0, 1, len(deviceList))))
-    colors = [i for i in color]
-
-    fig, ax1 = plt.subplots(figsize=(30 * centimetre, 20 * centimetre))
-    plt.subplots_adjust(left=None, bottom=None, right=0.8, top=None, wspace=None, hspace=None)
-
-    for j in range(repeats):
-        for i, device in enumerate(deviceList):
-            my_Pi.setMuxToOutput(device)  # sets multiplexer to the desired device
-            time.sleep(0.5)  # short wait to settle. May not be necessary. Can investigate later
-            time_1 = time.time() - t0  # Gets time relative to start time of the measurement
-            df = U.sweep(Dct)  # Perform IV sweep using the NIDAQ pyne module
-            Params = {'ID': [U.readCurrentID()], 'repeat': j, 'time': [time_1], 'datetime': [datetime.now()],
-                      'device': [device], 'V_SD': [list(df['V_SD'])],
-                      'I_SD': [list(df['I_SD'])]}  # inserts data for results table
-            print(str(Params['ID']) + ' + ' + str(j))  # prints status to console
-            MasterDF = merge_df(Params, fit_for_Master(df, 'V_SD', 'I_SD'),
-                                 MasterDF)  # Performs linear fit of IV sweep to get G and adds G to result table
-            df1 = MasterDF[MasterDF['device'] == device]  # creates dataframe with just one device to plot as a distinct line in live plot
-            # live plotting. Adding legend on first repeat zero
-            if i % plot_speed == 0:
-                if len(MasterDF.device.unique()) < len(deviceList):
-                    analysis.plot_all_live(MasterDF, ax1=ax1, label=False)
+    if plot:
+        centimetre = 1 / 2.54
+        fig, ax1 = plt.subplots(figsize=(30 * centimetre, 20 * centimetre))
+        plt.subplots_adjust(left=None, bottom=None, right=0.8, top=None, wspace=None, hspace=None)
+        # appends new points, redraws by wall clock
+        live_plot = analysis.LivePlot(ax1, deviceList, interval=plot_interval)
+        live_plot.add_many(results.device[:len(results)], results.time[:len(results)], results.G[:len(results)])
+        stats = live_plot.stats
+        plt.show(block=False)
+    else:
+        live_plot = None
+        stats = RunningStats()
+        stats.update_many(results.device[:len(results)], results.G[:len(results)])
+
+    def acquire(put, stop_event):  # producer, runs in its own thread and only talks to the instruments
+        for j in range(first_repeat, repeats):
+            for i, device in enumerate(scanList):
+                if j == first_repeat and i < first_index:
+                    continue  # already measured before the run was resumed
+                control.wait_if_paused(stop_event)
+                if stop_event.is_set() or control.stopping():  # stop after the device that was just measured
+                    return
+                my_Pi.setMuxToOutput(device)  # sets multiplexer to the desired device
+                if settle_detector is None:
+                    clock.sleep(settle_time)  # short wait to settle
                 else:
-                    analysis.plot_all_live(MasterDF, ax1=ax1, label=True)
-
-                    if add_legend:
-                        analysis.plot_all_live_add_legend(ax1)
-                        add_legend = False
-
-            plt.pause(0.01)  # needed for live plotting to work
-        #addlegend = False
-        time.sleep(delay)  # delay set by user input
-
-        with open('G:/Shared drives/Nanoelectronics Team Drive/Data/2021/Marta/Stop button/stop.txt', 'r') as f:
-            r = f.read()
-        if r == 'stop':
-            print('stop')
-            with open(basePath + '/comments.txt', 'a') as c:
-                c.write('\n\n---------measurement was ended using stop.txt---------\n\n')
-            break
-
-    my_Pi.setMuxToOutput(0)  # sets multiplexer to 0
+                    settle_detector.wait(device)  # waits until the input has settled, learned per device
+                time_1 = clock.time() - t0  # Gets time relative to start time of the measurement
+                ID, V, I_SD = backend.sweep(V_SD)  # Perform IV sweep
+                df = {'V_SD': V, 'I_SD': I_SD}
+                Params = {'ID': [ID], 'repeat': j, 'time': [time_1], 'datetime': [clock.now()],
+                          'device': [device], 'V_SD': [V],
+                          'I_SD': [I_SD]}  # inserts data for results table
+                put((Params, df))
+            clock.sleep(delay)  # delay set by user input
+
+            if control.finishing():
+                return
+
+    def fit(item):  # consumers, run in the main thread in this order
+        Params, df = item
+        # prints status to console
+        print(str(Params['ID']) + ' + ' + str(Params['repeat']) + ' (queue: ' + str(pipeline.depth()) + ')')
+        # Performs linear fit of IV sweep to get G and adds G to result table
+        results.add(Params, fit_for_Master(df, 'V_SD', 'I_SD'))
+
+    def persist(item):
+        if item[0]['device'][0] == scanList[-1]:
+            checkpoint.write(results)  # appends the finished repeat to disk
+
+    def draw(item):
+        nonlocal add_legend
+        Params = item[0]
+        if live_plot is None:
+            stats.update(Params['device'][0], results.G[len(results) - 1])
+            return
+        live_plot.add(Params['device'][0], Params['time'][0], results.G[len(results) - 1])
+        if add_legend and len(results) >= len(deviceList):  # legend once every device has a line
+            live_plot.add_legend()
+            add_legend = False
+        live_plot.redraw()
+
+    control = RunControl(port=control_port, command_file=control_file).start()  # local stop/pause channel
+    print(control.instructions())
+    pipeline = SweepPipeline()
+    try:
+        pipeline.run(acquire, [fit, persist, draw], idle=live_plot.redraw if plot else None)
+    finally:  # also after an instrument or consumer error, so the run can be resumed
+        control.close()
+        checkpoint.write(results)  # rows of an unfinished repeat
+        my_Pi.setMuxToOutput(0)  # sets multiplexer to 0
+        backend.close()
+    if control.reason is not None:
+        print(control.reason)
+        with open(basePath + '/comments.txt', 'a') as c:
+            c.write('\n\n---------measurement was ended early: ' + control.reason + '---------\n\n')
+    print(pipeline.report())
+    print(my_Pi.switchReport())
+    if settle_detector is not None:
+        print(settle_detector.report())
+
+    if plot:
+        live_plot.redraw(force=True)  # shows the last points
+
+    if iv_features:
+        results.compute_features()  # one batched call over all sweeps
+    MasterDF = results.to_dataframe()
 
     MasterDF.to_csv(basePath + '/' + fileName + '.csv')  # save results table after each repeat
+    if len(results) == 0:  # stopped before the first sweep, nothing to save or analyse
+        print('no sweeps were measured')
+        return MasterDF, basePath
 
-    MasterDF.to_csv(
-        basePath + '/' + fileName + str(Params['ID']) + '.csv')  # save final results table with ID of the last sweep.
+    # save final results table with ID of the last sweep.
+    MasterDF.to_csv(basePath + '/' + fileName + str([int(results.ID[len(results) - 1])]) + '.csv')
 
-    dfa = analysis.get_G_average(MasterDF)
+    dfa = stats.to_frame()  # same table as analysis.get_G_average(MasterDF), kept up to date during the run
 
     Path(basePath + "/devices").mkdir(parents=True, exist_ok=True)
 
@@ -158,9 +233,14 @@ def micr_measure(deviceList=[i for i in range(1, 47)],
     analysis.save_for_manual_plot(MasterDF, basePath, save=True)
 
     with open(basePath + '/comments.txt', 'a') as f:
-        f.write('average values: \n' + dfa.to_string() + '\n \n' + 'measurement finished at ' + str(datetime.now()))
+        f.write('average values: \n' + dfa.to_string() + '\n \n' + pipeline.report() + '\n' +
+                memory_report(MasterDF) + '\n' +
+                my_Pi.switchReport() + '\n' +
+                (settle_detector.report() + '\n' if settle_detector is not None else '') +
+                'measurement finished at ' + str(clock.now()))
 
-    analysis.plot_all(MasterDF, title=fileName, save=True, basepath=basePath)
+    analysis.plot_all(MasterDF, title=fileName, save=True, basepath=basePath, cutoff=cutoff,
+                      close=not plot)
 
     return MasterDF, basePath
 
@@ -172,7 +252,7 @@ if __name__ == '__main__':
     df, basePath = micr_measure(repeats=5, currentVoltagePreAmp_gain=1E3,
                  deviceList=[i for i in range(1, 47)],
                  comment=comment,
-                 plot_speed=10)
+                 plot_interval=1.0)
 
     t1 = time.time()
 
@@ -0,0 +1,23 @@
+"""
+Process pool shared by the batch functions (analysis.check_values_batch, reports.render_reports,
+workload.generate_workload, resampling). They all take n_jobs with the meaning of map_tasks:
+    None   one worker process per CPU
+    1      no pool, the tasks run one after the other in the calling process
+    k      k worker processes
+A pool never has more workers than tasks.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+
+def map_tasks(func, tasks, n_jobs=None, initializer=None):
+    """[func(task) for task in tasks] on a pool of n_jobs processes, results in task order.
+    A single task also runs in the calling process, unless an initializer is given: it sets up every worker
+    (e.g. switches matplotlib to Agg) and the tasks then always run in workers, leaving the calling process alone."""
+    tasks = list(tasks)
+    if not tasks:
+        return []
+    if initializer is None and (n_jobs == 1 or len(tasks) < 2):
+        return [func(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=min(n_jobs or os.cpu_count(), len(tasks)), initializer=initializer) as pool:
+        return list(pool.map(func, tasks))
@@ -1,68 +1,77 @@
 """
 This class sets up the pi to be controlled remotely. The truth table is that of the multiplexer.
+The truth table is precompiled into GPIO bitmasks, a switch only writes the pins that change, as pigpio bank writes.
 """
-from gpiozero import LED
-from gpiozero.pins.pigpio import PiGPIOFactory
+import time
+
+#Truth table of the multiplexer, rows are [A3, A2, A1, A0, E1, E2, E3, E4]
+TRUTH_TABLE = {0: [0, 0, 0, 0, 0, 0, 0, 0], #OFF
+               12: [0, 0, 0, 0, 1, 0, 0, 0], #MUX1 contact 1 (1)
+               11: [0, 0, 0, 1, 1, 0, 0, 0], #MUX1 contact 2 (2)
+               10: [0, 0, 1, 0, 1, 0, 0, 0], #MUX1 contact 3  (3)
+               9: [0, 0, 1, 1, 1, 0, 0, 0], #MUX1 contact 4  (4)
+               8: [0, 1, 0, 0, 1, 0, 0, 0], #MUX1 contact 5  (5)
+               7: [0, 1, 0, 1, 1, 0, 0, 0], #MUX1 contact 6  (6)
+               6: [0, 1, 1, 0, 1, 0, 0, 0], #MUX1 contact 7  (7)
+               5: [0, 1, 1, 1, 1, 0, 0, 0], #MUX1 contact 8  (8)
+               4: [1, 0, 0, 0, 1, 0, 0, 0], #MUX1 contact 9  (9)
+               3: [1, 0, 0, 1, 1, 0, 0, 0], #MUX1 contact 10  (10)
+               2: [1, 0, 1, 0, 1, 0, 0, 0], #MUX1 contact 11 (11)
+               1: [1, 0, 1, 1, 1, 0, 0, 0], #MUX1 contact 12  (12)
+               'NCMUX1C13': [1, 1, 0, 0, 1, 0, 0, 0], #MUX1 contact 13  (13)
+               'NCMUX1C14': [1, 1, 0, 1, 1, 0, 0, 0], #MUX1 contact 14  (14)
+               24: [1, 1, 1, 0, 1, 0, 0, 0], #MUX1 contact 15 (15)
+               25: [1, 1, 1, 1, 1, 0, 0, 0], #MUX1 contact 16 (16)
+               26: [0, 0, 0, 0, 0, 1, 0, 0], #MUX2 contact 1  (17)
+               27: [0, 0, 0, 1, 0, 1, 0, 0], #MUX2 contact 2  (18)
+               28: [0, 0, 1, 0, 0, 1, 0, 0], #MUX2 contact 3  (19)
+               29: [0, 0, 1, 1, 0, 1, 0, 0], #MUX2 contact 4  (20)
+               30: [0, 1, 0, 0, 0, 1, 0, 0], #MUX2 contact 5  (21)
+               31: [0, 1, 0, 1, 0, 1, 0, 0], #MUX2 contact 6  (22)
+               32: [0, 1, 1, 0, 0, 1, 0, 0], #MUX2 contact 7  (23)
+               33: [0, 1, 1, 1, 0, 1, 0, 0], #MUX2 contact 8  (24)
+               34: [1, 0, 0, 0, 0, 1, 0, 0], #MUX2 contact 9  (25)
+               'E_top': [1, 0, 0, 1, 0, 1, 0, 0], #MUX2 contact 10 (26)
+               35: [0, 0, 0, 0, 0, 0, 1, 0], #MUX3 contact 1 (1)
+               36: [0, 0, 0, 1, 0, 0, 1, 0], #MUX3 contact 2 (2)
+               37: [0, 0, 1, 0, 0, 0, 1, 0], #MUX3 contact 3 (3)
+               38: [0, 0, 1, 1, 0, 0, 1, 0], #MUX3 contact 4 (4)
+               39: [0, 1, 0, 0, 0, 0, 1, 0], #MUX3 contact 5 (5)
+               40: [0, 1, 0, 1, 0, 0, 1, 0], #MUX3 contact 6 (6)
+               41: [0, 1, 1, 0, 0, 0, 1, 0], #MUX3 contact 7 (7)
+               42: [0, 1, 1, 1, 0, 0, 1, 0], #MUX3 contact 8 (8)
+               43: [1, 0, 0, 0, 0, 0, 1, 0], #MUX3 contact 9 (9)
+               44: [1, 0, 0, 1, 0, 0, 1, 0], #MUX3 contact 10 (10)
+               45: [1, 0, 1, 0, 0, 0, 1, 0], #MUX3 contact 11 (11)
+               46: [1, 0, 1, 1, 0, 0, 1, 0], #MUX3 contact 12 (12)
+               'NC_MUX3C13': [1, 1, 0, 0, 0, 0, 1, 0], #MUX3 contact 13 (13)
+               'NC_MUX3C14': [1, 1, 0, 1, 0, 0, 1, 0], #MUX3 contact 14 (14)
+               23: [1, 1, 1, 0, 0, 0, 1, 0], #MUX3 contact 15 (15)
+               22: [1, 1, 1, 1, 0, 0, 1, 0], #MUX3 contact 16 (16)
+               21: [0, 0, 0, 0, 0, 0, 0, 1], #MUX4 contact 1  (17)
+               20: [0, 0, 0, 1, 0, 0, 0, 1], #MUX4 contact 2 (18)
+               19: [0, 0, 1, 0, 0, 0, 0, 1], #MUX4 contact 3 (19)
+               18: [0, 0, 1, 1, 0, 0, 0, 1], #MUX4 contact 4 (20)
+               17: [0, 1, 0, 0, 0, 0, 0, 1], #MUX4 contact 5 (21)
+               16: [0, 1, 0, 1, 0, 0, 0, 1], #MUX4 contact 6 (22)
+               15: [0, 1, 1, 0, 0, 0, 0, 1], #MUX4 contact 7 (23)
+               14: [0, 1, 1, 1, 0, 0, 0, 1], #MUX4 contact 8 (24)
+               13: [1, 0, 0, 0, 0, 0, 0, 1], #MUX4 contact 9 (25)
+               'E_bottom': [1, 0, 0, 1, 0, 0, 0, 1]} #MUX4 contact 10 (26)
+
+#GPIO numbers in the order of the truth table columns
+LIST_GPIO = [21, 20, 16, 12, 6, 13, 19, 26]
 
 
 class PiMUX:
 
-    def __init__(self, IP = '129.94.163.203'):
+    def __init__(self, IP = '129.94.163.203', bank_write = True):
+        from gpiozero import LED
+        from gpiozero.pins.pigpio import PiGPIOFactory
+
         self.IP = IP
         self.PiFactory = PiGPIOFactory(host= self.IP)
-        self.TruthTable = {0: [0, 0, 0, 0, 0, 0, 0, 0], #OFF
-                  12: [0, 0, 0, 0, 1, 0, 0, 0], #MUX1 contact 1 (1)
-                  11: [0, 0, 0, 1, 1, 0, 0, 0], #MUX1 contact 2 (2)
-                  10: [0, 0, 1, 0, 1, 0, 0, 0], #MUX1 contact 3  (3)
-                  9: [0, 0, 1, 1, 1, 0, 0, 0], #MUX1 contact 4  (4)
-                  8: [0, 1, 0, 0, 1, 0, 0, 0], #MUX1 contact 5  (5)
-                  7: [0, 1, 0, 1, 1, 0, 0, 0], #MUX1 contact 6  (6)
-                  6: [0, 1, 1, 0, 1, 0, 0, 0], #MUX1 contact 7  (7)
-                  5: [0, 1, 1, 1, 1, 0, 0, 0], #MUX1 contact 8  (8)
-                  4: [1, 0, 0, 0, 1, 0, 0, 0], #MUX1 contact 9  (9)
-                  3: [1, 0, 0, 1, 1, 0, 0, 0], #MUX1 contact 10  (10)
-                  2: [1, 0, 1, 0, 1, 0, 0, 0], #MUX1 contact 11 (11)
-                  1: [1, 0, 1, 1, 1, 0, 0, 0], #MUX1 contact 12  (12)
-                  'NCMUX1C13': [1, 1, 0, 0, 1, 0, 0, 0], #MUX1 contact 13  (13)
-                  'NCMUX1C14': [1, 1, 0, 1, 1, 0, 0, 0], #MUX1 contact 14  (14)
-                  24: [1, 1, 1, 0, 1, 0, 0, 0], #MUX1 contact 15 (15)
-                  25: [1, 1, 1, 1, 1, 0, 0, 0], #MUX1 contact 16 (16)
-                  26: [0, 0, 0, 0, 0, 1, 0, 0], #MUX2 contact 1  (17)
-                  27: [0, 0, 0, 1, 0, 1, 0, 0], #MUX2 contact 2  (18)
-                  28: [0, 0, 1, 0, 0, 1, 0, 0], #MUX2 contact 3  (19)
-                  29: [0, 0, 1, 1, 0, 1, 0, 0], #MUX2 contact 4  (20)
-                  30: [0, 1, 0, 0, 0, 1, 0, 0], #MUX2 contact 5  (21)
-                  31: [0, 1, 0, 1, 0, 1, 0, 0], #MUX2 contact 6  (22)
-                  32: [0, 1, 1, 0, 0, 1, 0, 0], #MUX2 contact 7  (23)
-                  33: [0, 1, 1, 1, 0, 1, 0, 0], #MUX2 contact 8  (24)
-                  34: [1, 0, 0, 0, 0, 1, 0, 0], #MUX2 contact 9  (25)
-                  'E_top': [1, 0, 0, 1, 0, 1, 0, 0], #MUX2 contact 10 (26)
-                  35: [0, 0, 0, 0, 0, 0, 1, 0], #MUX3 contact 1 (1)
-                  36: [0, 0, 0, 1, 0, 0, 1, 0], #MUX3 contact 2 (2)
-                  37: [0, 0, 1, 0, 0, 0, 1, 0], #MUX3 contact 3 (3)
-                  38: [0, 0, 1, 1, 0, 0, 1, 0], #MUX3 contact 4 (4)
-                  39: [0, 1, 0, 0, 0, 0, 1, 0], #MUX3 contact 5 (5)
-                  40: [0, 1, 0, 1, 0, 0, 1, 0], #MUX3 contact 6 (6)
-                  41: [0, 1, 1, 0, 0, 0, 1, 0], #MUX3 contact 7 (7)
-                  42: [0, 1, 1, 1, 0, 0, 1, 0], #MUX3 contact 8 (8)
-                  43: [1, 0, 0, 0, 0, 0, 1, 0], #MUX3 contact 9 (9)
-                  44: [1, 0, 0, 1, 0, 0, 1, 0], #MUX3 contact 10 (10)
-                  45: [1, 0, 1, 0, 0, 0, 1, 0], #MUX3 contact 11 (11)
-                  46: [1, 0, 1, 1, 0, 0, 1, 0], #MUX3 contact 12 (12)
-                  'NC_MUX3C13': [1, 1, 0, 0, 0, 0, 1, 0], #MUX3 contact 13 (13)
-                  'NC_MUX3C14': [1, 1, 0, 1, 0, 0, 1, 0], #MUX3 contact 14 (14)
-                  23: [1, 1, 1, 0, 0, 0, 1, 0], #MUX3 contact 15 (15)
-                  22: [1, 1, 1, 1, 0, 0, 1, 0], #MUX3 contact 16 (16)
-                  21: [0, 0, 0, 0, 0, 0, 0, 1], #MUX4 contact 1  (17)
-                  20: [0, 0, 0, 1, 0, 0, 0, 1], #MUX4 contact 2 (18)
-                  19: [0, 0, 1, 0, 0, 0, 0, 1], #MUX4 contact 3 (19)
-                  18: [0, 0, 1, 1, 0, 0, 0, 1], #MUX4 contact 4 (20)
-                  17: [0, 1, 0, 0, 0, 0, 0, 1], #MUX4 contact 5 (21)
-                  16: [0, 1, 0, 1, 0, 0, 0, 1], #MUX4 contact 6 (22)
-                  15: [0, 1, 1, 0, 0, 0, 0, 1], #MUX4 contact 7 (23)
-                  14: [0, 1, 1, 1, 0, 0, 0, 1], #MUX4 contact 8 (24)
-                  13: [1, 0, 0, 0, 0, 0, 0, 1], #MUX4 contact 9 (25)
-                  'E_bottom': [1, 0, 0, 1, 0, 0, 0, 1]} #MUX4 contact 10 (26)
+        self.TruthTable = dict(TRUTH_TABLE)
 
         #Define what GPIO pins are connected to the selector pins on the MUX
 
@@ -76,16 +85,69 @@ class PiMUX:
         self.A2_pin = LED(20,pin_factory = self.PiFactory)
         self.A3_pin = LED(21,pin_factory = self.PiFactory) #A3_pin =  LED(21,pin_factory = PiFactory) return
 
-        self.listPins = [self.A3_pin,self.A2_pin,self.A1_pin,self.A0_pin,self.E1_pin,self.E2_pin,self.E3_pin,self.E4_pin]
+        self.listPins = [self.A3_pin,self.A2_pin,self.A1_pin,self.A0_pin,
+                         self.E1_pin,self.E2_pin,self.E3_pin,self.E4_pin]
+        self.setupMasks(bank_write)
+
+    def setupMasks(self, bank_write=True, timer=time.perf_counter):
+        #timer() times the switches for switchReport, perf_counter in the lab (a simulated clock in backends.SimMUX)
+        self.timer = timer
+        self.listGPIO = list(LIST_GPIO) #GPIO numbers in the order of listPins and the truth table columns
 
-        #Uses truth table to set GPIO pin voltages to activate desired output.
+        #Truth table as bitmasks over the GPIO numbers (bit n = GPIO n), used for bank writes
+        self.masks = {output: self.toMask(row) for output, row in self.TruthTable.items()}
+        self.allPinsMask = self.toMask([1] * len(self.listGPIO))
+
+        self.bank_write = bank_write
+        self.state = None #mask currently on the pins, unknown until the first switch
+        self.n_switches = 0
+        self.switch_time_sum = 0.0
+        self.switch_time_max = 0.0
+        self.last_switch_time = 0.0
+
+    def toMask(self, row):
+        mask = 0
+        for gpio, on in zip(self.listGPIO, row):
+            if on:
+                mask |= 1 << gpio
+        return mask
+
+    #Uses truth table to set GPIO pin voltages to activate desired output.
 
     def setMuxToOutput(self, desiredOutput):
-        for index,item in enumerate(self.listPins):
-            if self.TruthTable[desiredOutput][index]:
-                item.on()
-            else:
-                item.off()
+        t_start = self.timer()
+        target = self.masks[desiredOutput]
+        changed = self.allPinsMask if self.state is None else self.state ^ target
+        pins_off = changed & ~target
+        pins_on = changed & target
+        if self.bank_write:
+            #clear first so the old enable line goes off before the new one comes on (break before make).
+            #Each bank call is one round trip to the pigpio daemon, pins that don't change are not sent at all.
+            #Bank writes bypass the gpiozero LED objects, so their .value is not updated.
+            pi = self.PiFactory.connection
+            if pins_off:
+                pi.clear_bank_1(pins_off)
+            if pins_on:
+                pi.set_bank_1(pins_on)
+        else:
+            for gpio, item in zip(self.listGPIO, self.listPins):
+                if pins_off >> gpio & 1:
+                    item.off()
+            for gpio, item in zip(self.listGPIO, self.listPins):
+                if pins_on >> gpio & 1:
+                    item.on()
+        self.state = target
+        self.last_switch_time = self.timer() - t_start
+        self.n_switches += 1
+        self.switch_time_sum += self.last_switch_time
+        self.switch_time_max = max(self.switch_time_max, self.last_switch_time)
+
+    def switchReport(self):
+        """Latency of setMuxToOutput since the MUX was set up."""
+        mean = self.switch_time_sum / self.n_switches if self.n_switches else 0.0
+        return ('MUX switches = ' + str(self.n_switches) + '\n' +
+                'mean switch time = ' + '{:.2f}'.format(mean * 1E3) + ' ms\n' +
+                'max switch time = ' + '{:.2f}'.format(self.switch_time_max * 1E3) + ' ms\n')
 
 
 if __name__ == "__main__": # execute only if this script is run , not when it's being imported\
@@ -0,0 +1,88 @@
+"""
+Producer/consumer pipeline for the measurement loops. The producer (MUX switching and IV sweeps) runs in its
+own thread and puts raw sweeps on a bounded queue, the consumers (fitting, results table, checkpointing,
+live plotting) run in the calling thread, which has to be the main thread for matplotlib.
+"""
+import queue
+import threading
+import time
+
+_DONE = object()  # put on the queue when the producer returns
+
+
+class SweepPipeline:
+
+    def __init__(self, maxsize=64):
+        """maxsize bounds the queue, the producer blocks once that many sweeps are waiting."""
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.stop_event = threading.Event()
+        self.error = None
+        self.n = 0
+        self.max_depth = 0
+        self.lag_sum = 0.0
+        self.max_lag = 0.0
+
+    def put(self, item):
+        """Called by the producer for every sweep. Returns False if the pipeline is stopping."""
+        while not self.stop_event.is_set():
+            try:
+                self.queue.put((time.time(), item), timeout=0.1)
+            except queue.Full:
+                continue
+            self.max_depth = max(self.max_depth, self.queue.qsize())
+            return True
+        return False
+
+    def _produce(self, producer):
+        try:
+            producer(self.put, self.stop_event)
+        except BaseException as e:  # re-raised in the main thread by run
+            self.error = e
+        finally:
+            while True:
+                try:
+                    self.queue.put((time.time(), _DONE), timeout=0.1)
+                    break
+                except queue.Full:
+                    if self.stop_event.is_set():  # nobody is consuming any more
+                        break
+
+    def run(self, producer, consumers, idle=None, poll=0.05):
+        """Runs producer(put, stop_event) in a thread and hands every item it puts to each consumer in turn.
+        idle() is called whenever the queue is empty for poll seconds, e.g. to keep a plot window responsive."""
+        thread = threading.Thread(target=self._produce, args=(producer,), daemon=True)
+        thread.start()
+        try:
+            while True:
+                try:
+                    t_put, item = self.queue.get(timeout=poll)
+                except queue.Empty:
+                    if idle is not None:
+                        idle()
+                    continue
+                if item is _DONE:
+                    break
+                lag = time.time() - t_put
+                self.n += 1
+                self.lag_sum += lag
+                self.max_lag = max(self.max_lag, lag)
+                for consumer in consumers:
+                    consumer(item)
+        except BaseException:
+            self.stop_event.set()  # a failing consumer stops the acquisition after the current sweep
+            thread.join()
+            raise
+        thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def depth(self):
+        return self.queue.qsize()
+
+    def report(self):
+        """Queue and consumer lag statistics as a short text."""
+        mean_lag = self.lag_sum / self.n if self.n else 0.0
+        return ('sweeps processed = ' + str(self.n) + '\n' +
+                'max queue depth = ' + str(self.max_depth) + '\n' +
+                'mean consumer lag = ' + '{:.3f}'.format(mean_lag) + ' s\n' +
+                'max consumer lag = ' + '{:.3f}'.format(self.max_lag) + ' s\n')
@@ -0,0 +1,117 @@
+"""
+Headless rendering of the summary figures of many runs on the Agg backend, one run per worker process.
+Figures:
+    summary  analysis.plot_all, saved as summary.png
+    stats    analysis.basic_stat_2seg (box plot and change histograms), saved as stats_2seg.png
+A figure is only redrawn when its input changed: the hash of the master csv and of the plot settings is kept in
+report_cache.json in the run folder and compared before rendering.
+Rendering always happens in worker processes switched to Agg, the matplotlib backend of the calling process is
+left alone.
+"""
+import hashlib
+import json
+import pandas as pd
+from parallel import map_tasks
+
+RENDER_VERSION = 1  # increase when the figures change, so cached figures are redrawn
+CACHE_FILE = 'report_cache.json'
+FIGURES = {'summary': 'summary.png', 'stats': 'stats_2seg.png'}
+
+
+def file_hash(path, blocksize=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(blocksize), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def figure_hash(data_hash, figure, settings):
+    """Hash of everything a figure depends on: input data, figure name, its settings and RENDER_VERSION."""
+    key = json.dumps([RENDER_VERSION, data_hash, figure, settings], sort_keys=True, default=str)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def _load_cache(path):
+    try:
+        with open(path / CACHE_FILE, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _stale(path, master_path, figures, settings, force):
+    """Hash keys of the figures of a run that have to be redrawn."""
+    cache = _load_cache(path)
+    data_hash = file_hash(master_path)
+    keys = {}
+    for figure in figures:
+        key = figure_hash(data_hash, figure, settings[figure])
+        if force or cache.get(figure) != key or not (path / FIGURES[figure]).exists():
+            keys[figure] = key
+    return keys
+
+
+def _init_worker():
+    import matplotlib
+
+    matplotlib.use('Agg')
+
+
+def _render_run(task):
+    """Renders the given figures of one run in a worker. Returns {figure: 'rendered' | 'error: ...'}."""
+    import matplotlib.pyplot as plt
+    from analysis import plot_all, basic_stat_2seg
+
+    path, master_path, title, keys, settings = task
+    df = pd.read_csv(master_path, usecols=lambda c: c in ('ID', 'repeat', 'time', 'device', 'G'))
+    status = {}
+    done = {}
+    for figure, key in keys.items():
+        try:
+            if figure == 'summary':
+                plot_all(df, title=title, save=True, basepath=str(path), close=True, **settings[figure])
+            elif figure == 'stats':
+                basic_stat_2seg(df, save_as=str(path / FIGURES[figure]), close=True, **settings[figure])
+        except Exception as e:
+            plt.close('all')
+            status[figure] = 'error: ' + repr(e)
+            continue
+        done[figure] = key
+        status[figure] = 'rendered'
+    cache = _load_cache(path)
+    cache.update(done)
+    with open(path / CACHE_FILE, 'w') as f:
+        json.dump(cache, f, indent=1)
+    return status
+
+
+def render_reports(runs, figures=('summary', 'stats'), summary=None, stats=None, n_jobs=None, force=False):
+    """Renders the figures of many runs, skipping figures whose master csv and settings did not change.
+    runs are catalog.Run objects or run folders. summary and stats are keyword arguments for plot_all and
+    basic_stat_2seg (e.g. stats=dict(event_repeat=20, seed=0)). force=True redraws everything.
+    n_jobs is the number of worker processes (parallel.map_tasks, all CPUs if None; even n_jobs=1 renders in a
+    worker).
+    Returns a table indexed by run with the status of every figure."""
+    from catalog import Run
+
+    runs = [run if isinstance(run, Run) else Run(run) for run in runs]
+    for figure in figures:
+        if figure not in FIGURES:
+            raise ValueError('unknown figure ' + repr(figure) + ', choose from ' + str(list(FIGURES)))
+    settings = {'summary': dict(summary or {}), 'stats': dict(stats or {})}
+    if 'seed' not in settings['stats']:
+        settings['stats']['seed'] = 0  # unseeded resampling would give a new figure for unchanged data
+
+    status = {run.name: {figure: 'cached' for figure in figures} for run in runs}
+    tasks, names = [], []
+    for run in runs:
+        keys = _stale(run.path, run.master_path, figures, settings, force)
+        if keys:
+            tasks.append((run.path, run.master_path, run.meta.get('fileName', run.name), keys, settings))
+            names.append(run.name)
+
+    results = map_tasks(_render_run, tasks, n_jobs, initializer=_init_worker)
+    for name, result in zip(names, results):
+        status[name].update(result)
+    return pd.DataFrame.from_dict(status, orient='index').rename_axis('run')
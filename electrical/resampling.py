@@ -0,0 +1,101 @@
+"""
+Bootstrap confidence intervals and paired permutation tests for before/after comparisons of device means
+(analysis.basic_stat_2seg). All replicates of a block are drawn at once as index arrays (bootstrap) or swap masks
+(permutation) and reduced with array operations. Replicates are drawn in fixed blocks, each from its own child of
+one SeedSequence, so a seeded result is the same with or without the process pool. n_jobs is the number of
+processes (parallel.map_tasks); a single comparison runs in the calling process by default, compare_many on all CPUs.
+"""
+import numpy as np
+import pandas as pd
+from parallel import map_tasks
+from simulation_utils import make_seed_sequence
+
+BLOCK = 5000  # replicates per block (and per pool task)
+
+
+def changes(before, after):
+    """Mean relative and mean absolute change over the last axis."""
+    return ((after - before) / before).mean(axis=-1), (after - before).mean(axis=-1)
+
+
+def _bootstrap_block(task):
+    before, after, n, seed = task
+    rng = np.random.default_rng(seed)
+    index = rng.integers(0, before.size, size=(n, before.size))
+    return changes(before[index], after[index])
+
+
+def _permutation_block(task):
+    before, after, n, seed = task
+    rng = np.random.default_rng(seed)
+    swap = rng.random((n, before.size)) < 0.5  # swap before and after of a device
+    return changes(np.where(swap, after, before), np.where(swap, before, after))
+
+
+def _run_blocks(block, before, after, n_replicates, seed, n_jobs):
+    """Draws n_replicates with block in blocks of BLOCK. Returns (relative, absolute) arrays of the statistic."""
+    sizes = [BLOCK] * (n_replicates // BLOCK) + ([n_replicates % BLOCK] if n_replicates % BLOCK else [])
+    seeds = make_seed_sequence(seed).spawn(len(sizes))
+    results = map_tasks(block, [(before, after, n, s) for n, s in zip(sizes, seeds)], n_jobs)
+    return np.concatenate([r[0] for r in results]), np.concatenate([r[1] for r in results])
+
+
+def _paired(before, after):
+    before = np.asarray(before, dtype=np.float64)
+    after = np.asarray(after, dtype=np.float64)
+    keep = ~(np.isnan(before) | np.isnan(after))
+    return before[keep], after[keep]
+
+
+def _two_sided(replicates, observed):
+    """Two-sided p-value from both tails, the relative change is not symmetric under swapping."""
+    n = replicates.size
+    upper = (np.sum(replicates >= observed) + 1) / (n + 1)
+    lower = (np.sum(replicates <= observed) + 1) / (n + 1)
+    return min(1.0, 2 * min(upper, lower))
+
+
+def bootstrap_ci(before, after, n_boot=10000, ci=0.95, seed=None, n_jobs=1):
+    """Percentile bootstrap intervals of the mean relative and absolute change, resampling devices.
+    Returns a table with rows relative/absolute and columns estimate, ci_low, ci_high."""
+    before, after = _paired(before, after)
+    relative, absolute = _run_blocks(_bootstrap_block, before, after, n_boot, seed, n_jobs)
+    alpha = (1 - ci) / 2
+    return pd.DataFrame({'estimate': changes(before, after),
+                         'ci_low': [np.quantile(relative, alpha), np.quantile(absolute, alpha)],
+                         'ci_high': [np.quantile(relative, 1 - alpha), np.quantile(absolute, 1 - alpha)]},
+                        index=['relative', 'absolute'])
+
+
+def permutation_test(before, after, n_perm=10000, seed=None, n_jobs=1):
+    """Two-sided paired permutation test of the mean relative and absolute change: before and after of each
+    device are swapped at random. Returns a Series of p-values indexed relative/absolute."""
+    before, after = _paired(before, after)
+    observed = changes(before, after)
+    relative, absolute = _run_blocks(_permutation_block, before, after, n_perm, seed, n_jobs)
+    p_rel = _two_sided(relative, observed[0])
+    p_abs = _two_sided(absolute, observed[1])
+    return pd.Series([p_rel, p_abs], index=['relative', 'absolute'], name='p_value')
+
+
+def compare(before, after, n_resamples=10000, ci=0.95, seed=None, n_jobs=1):
+    """bootstrap_ci and permutation_test in one table (estimate, ci_low, ci_high, p_value)."""
+    boot_seed, perm_seed = make_seed_sequence(seed).spawn(2)
+    table = bootstrap_ci(before, after, n_resamples, ci, boot_seed, n_jobs)
+    table['p_value'] = permutation_test(before, after, n_resamples, perm_seed, n_jobs)
+    return table
+
+
+def _compare_task(task):
+    before, after, n_resamples, ci, seed = task
+    return compare(before, after, n_resamples, ci, seed)
+
+
+def compare_many(pairs, n_resamples=10000, ci=0.95, seed=None, n_jobs=None):
+    """compare for many chips or event windows, pairs maps a name to (before, after) device means.
+    The pairs are spread over n_jobs processes (all CPUs if None). Returns one table indexed by name and change."""
+    names = list(pairs)
+    seeds = make_seed_sequence(seed).spawn(len(names))
+    tasks = [(pairs[name][0], pairs[name][1], n_resamples, ci, s) for name, s in zip(names, seeds)]
+    results = map_tasks(_compare_task, tasks, n_jobs)
+    return pd.concat(dict(zip(names, results)), names=['name', 'change'])
@@ -0,0 +1,216 @@
+"""
+Preallocated results table for the measurement loops. Rows are written in place into typed numpy columns
+and only turned into a pandas DataFrame (same columns as the old MasterDF) when asked for.
+
+The compact form of a results table (to_dataframe(compact=True) or compact()) uses small integer types for
+device and repeat, datetime64 for datetime and keeps the sweeps out of the table: V_SD and I_SD of all sweeps are
+two float32 arrays in df.attrs['sweeps'] (a Sweeps object) and the column sweep gives the row of every result
+in them. The analysis functions accept both forms.
+"""
+import sys
+import numpy as np
+import pandas as pd
+from fitting import FEATURE_COLUMNS, iv_features, parse_sweep_column
+
+COLUMNS = ['ID', 'repeat', 'time', 'datetime', 'device', 'V_SD', 'I_SD', 'G', 'std_err']
+# dtypes of the compact table. G and std_err stay float64, the relative spread of G is often below 1e-3.
+# Tables with named MUX outputs ('E_top') next to numbered devices keep device as a category instead of int16
+COMPACT_DTYPES = {'ID': np.int32, 'repeat': np.int32, 'time': np.float64, 'datetime': 'datetime64[us]',
+                  'device': np.int16, 'G': np.float64, 'std_err': np.float64, 'sweep': np.int32}
+SWEEP_DTYPE = np.float32  # DAQ readings have far less than float32 resolution
+
+
+class Sweeps:
+    """V_SD and I_SD of a compact results table as two (n_sweeps, n_points) arrays.
+    Frames derived from the table (filters, copies) share the arrays instead of copying them."""
+
+    def __init__(self, V_SD, I_SD):
+        self.V_SD = V_SD
+        self.I_SD = I_SD
+
+    def __deepcopy__(self, memo):
+        return self  # pandas deep-copies attrs on every operation
+
+    def __len__(self):
+        return len(self.V_SD)
+
+    def get(self, row):
+        return self.V_SD[row], self.I_SD[row]
+
+    @property
+    def nbytes(self):
+        return self.V_SD.nbytes + self.I_SD.nbytes
+
+
+def device_array(values):
+    """Device labels as int64 if they are all numbers, otherwise as objects (named MUX outputs of
+    pi_control.TRUTH_TABLE such as 'E_top' next to numbered devices). Numbers read back from a csv as strings
+    become ints again."""
+    if isinstance(values, np.ndarray) and values.dtype.kind in 'iu':
+        return values.astype(np.int64)
+    values = [int(v) if isinstance(v, str) and v.lstrip('-').isdigit() else v for v in list(values)]
+    if all(isinstance(v, (int, np.integer)) for v in values):
+        return np.array(values, dtype=np.int64)
+    out = np.empty(len(values), dtype=object)
+    out[:] = values
+    return out
+
+
+def _compact_dtype(name, values):
+    if name == 'device' and values.dtype == object:
+        return 'category'
+    return COMPACT_DTYPES[name]
+
+
+class ResultsBuffer:
+
+    def __init__(self, n_rows, n_points, features=False):
+        """n_rows is normally len(deviceList) * repeats, n_points the length of the V_SD sweep array.
+        features=True adds the fitting.iv_features columns after std_err, filled by compute_features."""
+        self.n_points = n_points
+        self.n = 0
+        self.features = features
+        self.columns = COLUMNS + (FEATURE_COLUMNS if features else [])
+        self.n_features = 0  # rows with features computed
+        self.named_devices = False  # device column holds objects once a named MUX output is added
+        self._allocate(max(int(n_rows), 1))
+
+    def _allocate(self, n_rows):
+        self.ID = np.zeros(n_rows, dtype=np.int64)
+        self.repeat = np.zeros(n_rows, dtype=np.int64)
+        self.time = np.zeros(n_rows, dtype=np.float64)
+        self.datetime = np.zeros(n_rows, dtype='datetime64[us]')
+        self.device = np.zeros(n_rows, dtype=object if self.named_devices else np.int64)
+        self.V_SD = np.zeros((n_rows, self.n_points), dtype=np.float64)
+        self.I_SD = np.zeros((n_rows, self.n_points), dtype=np.float64)
+        self.G = np.zeros(n_rows, dtype=np.float64)
+        self.std_err = np.zeros(n_rows, dtype=np.float64)
+        if self.features:
+            for name in FEATURE_COLUMNS:
+                setattr(self, name, np.full(n_rows, np.nan))
+
+    def _grow(self):
+        """Doubles the capacity. Only needed if more sweeps come in than the buffer was sized for."""
+        old = {name: getattr(self, name) for name in self.columns}
+        self._allocate(2 * len(self.ID))
+        for name, values in old.items():
+            getattr(self, name)[:self.n] = values[:self.n]
+
+    def _name_devices(self):
+        self.named_devices = True
+        self.device = self.device.astype(object)
+
+    def __len__(self):
+        return self.n
+
+    def add(self, Params, Fit):
+        """Adds one sweep. Takes the same Params and Fit dictionaries that merge_df takes."""
+        if self.n == len(self.ID):
+            self._grow()
+        k = self.n
+        row = dict(Params)
+        row.update(Fit)
+        for name in COLUMNS:
+            value = row[name]
+            if name in ('V_SD', 'I_SD'):
+                value = np.asarray(value, dtype=np.float64).reshape(-1)
+            elif isinstance(value, (list, tuple, np.ndarray)):
+                value = value[0]  # merge_df style dictionaries wrap scalars in one element lists
+            if name == 'device' and not self.named_devices and not isinstance(value, (int, np.integer)):
+                self._name_devices()
+            getattr(self, name)[k] = value
+        self.n += 1
+        return k
+
+    def extend(self, columns):
+        """Adds a block of rows. columns maps every name in COLUMNS to an array of equal length."""
+        m = len(columns['ID'])
+        while self.n + m > len(self.ID):
+            self._grow()
+        columns = dict(columns, device=device_array(columns['device']))
+        if columns['device'].dtype == object and not self.named_devices:
+            self._name_devices()
+        for name in COLUMNS:
+            getattr(self, name)[self.n:self.n + m] = columns[name]
+        self.n += m
+
+    def compute_features(self):
+        """Fills the feature columns of all rows added since the last call with one batched iv_features call."""
+        rows = slice(self.n_features, self.n)
+        for name, values in iv_features(self.V_SD[rows], self.I_SD[rows]).items():
+            getattr(self, name)[rows] = values
+        self.n_features = self.n
+
+    def to_dataframe(self, sweeps=True, start=0, stop=None, compact=False):
+        """Returns the filled rows (or rows start:stop) as a DataFrame with the MasterDF columns.
+        With sweeps=False the V_SD and I_SD columns are left out, which is much cheaper for live plotting.
+        compact=True returns the compact form (see the module docstring)."""
+        rows = slice(start, self.n if stop is None else stop)
+        if compact:
+            data = {name: pd.Series(getattr(self, name)[rows]).astype(_compact_dtype(name, getattr(self, name)))
+                    for name in COLUMNS if name not in ('V_SD', 'I_SD')}
+            df = pd.DataFrame(data)
+            for name in self.columns[len(COLUMNS):]:
+                df[name] = getattr(self, name)[rows]
+            if sweeps:
+                df['sweep'] = np.arange(len(df), dtype=COMPACT_DTYPES['sweep'])
+                df.attrs['sweeps'] = Sweeps(self.V_SD[rows].astype(SWEEP_DTYPE), self.I_SD[rows].astype(SWEEP_DTYPE))
+            return df
+        data = {'ID': self.ID[rows],
+                'repeat': self.repeat[rows],
+                'time': self.time[rows],
+                'datetime': pd.to_datetime(self.datetime[rows]),
+                'device': self.device[rows]}
+        if sweeps:
+            data['V_SD'] = self.V_SD[rows].tolist()
+            data['I_SD'] = self.I_SD[rows].tolist()
+        data['G'] = self.G[rows]
+        data['std_err'] = self.std_err[rows]
+        for name in self.columns[len(COLUMNS):]:
+            data[name] = getattr(self, name)[rows]
+        return pd.DataFrame(data)
+
+
+def compact(df):
+    """Compact form of a MasterDF (sweeps as lists, arrays or the list reprs of a csv). Returns a new DataFrame."""
+    out = pd.DataFrame({name: df[name].to_numpy() for name in COLUMNS if name in df and name not in ('V_SD', 'I_SD')})
+    if 'device' in out:
+        out['device'] = device_array(out['device'].to_numpy())
+    for name in out.columns:
+        if name == 'datetime':
+            out[name] = pd.to_datetime(out[name]).astype(COMPACT_DTYPES[name])
+        else:
+            out[name] = out[name].astype(_compact_dtype(name, out[name]))
+    for name in FEATURE_COLUMNS:
+        if name in df:
+            out[name] = df[name].to_numpy(dtype=np.float64)
+    if 'V_SD' in df and 'I_SD' in df:
+        sweeps = []
+        for name in ('V_SD', 'I_SD'):
+            column = df[name]
+            if len(column) and isinstance(column.iloc[0], str):
+                sweeps.append(parse_sweep_column(column).astype(SWEEP_DTYPE))
+            else:
+                sweeps.append(np.array(list(column), dtype=SWEEP_DTYPE).reshape(len(column), -1))
+        out['sweep'] = np.arange(len(out), dtype=COMPACT_DTYPES['sweep'])
+        out.attrs['sweeps'] = Sweeps(*sweeps)
+    return out
+
+
+def footprint(df):
+    """Memory used by a results table: rows, bytes of the table (object columns counted deep), bytes of the
+    shared sweep arrays, total and bytes per sweep."""
+    table_bytes = int(df.memory_usage(deep=True).sum())
+    for name in df.columns:  # deep memory_usage does not look into lists, e.g. the sweeps of a MasterDF
+        if df[name].dtype == object and len(df) and isinstance(df[name].iloc[0], list):
+            table_bytes += sum(sys.getsizeof(value) for item in df[name] for value in item)
+    sweep_bytes = df.attrs['sweeps'].nbytes if 'sweeps' in df.attrs else 0
+    total = table_bytes + sweep_bytes
+    return pd.Series({'rows': len(df), 'table_bytes': table_bytes, 'sweep_bytes': sweep_bytes, 'total_bytes': total,
+                      'bytes_per_sweep': total / len(df) if len(df) else np.nan})
+
+
+def memory_report(df):
+    info = footprint(df)
+    return ('results table: ' + str(int(info.rows)) + ' sweeps, ' + '{:.1f}'.format(info.total_bytes / 1e6) +
+            ' MB (' + '{:.0f}'.format(info.bytes_per_sweep) + ' bytes per sweep)\n')
@@ -0,0 +1,91 @@
+"""
+Per-device running statistics of G, updated one sweep (or one block of sweeps) at a time with Welford's
+algorithm. Accumulators of different runs, chunks or workers can be merged. to_frame gives the same table as
+analysis.get_G_average without going over the history again.
+"""
+import numpy as np
+import pandas as pd
+
+
+def device_order(device):
+    """Sort key of device labels: numbered devices first, then named MUX outputs ('E_top'), like pandas sorts them."""
+    return isinstance(device, str), device
+
+
+class RunningStats:
+
+    def __init__(self):
+        self.n = {}
+        self.mean = {}
+        self.M2 = {}  # sum of squared deviations from the mean
+
+    def update(self, device, G):
+        """Adds one sweep."""
+        n = self.n.get(device, 0) + 1
+        mean = self.mean.get(device, 0.0)
+        delta = G - mean
+        mean += delta / n
+        self.M2[device] = self.M2.get(device, 0.0) + delta * (G - mean)
+        self.mean[device] = mean
+        self.n[device] = n
+
+    def update_many(self, devices, Gs):
+        """Adds a block of sweeps, e.g. a chunk of a master csv. The block is reduced with one groupby and
+        merged in, so this is cheaper than calling update for every row."""
+        block = pd.DataFrame({'device': np.asarray(devices), 'G': np.asarray(Gs, dtype=np.float64)})
+        grouped = block.groupby('device', sort=False)['G']
+        n = grouped.count()
+        mean = grouped.mean()
+        M2 = grouped.var(ddof=0) * n
+        for device in n.index:
+            self._combine(device, int(n[device]), float(mean[device]), float(M2[device]))
+
+    def _combine(self, device, n_b, mean_b, M2_b):
+        """Chan et al. parallel update with the statistics of another set of sweeps of the same device."""
+        if n_b == 0:
+            return
+        n_a = self.n.get(device, 0)
+        if n_a == 0:
+            self.n[device], self.mean[device], self.M2[device] = n_b, mean_b, M2_b
+            return
+        mean_a = self.mean[device]
+        n = n_a + n_b
+        delta = mean_b - mean_a
+        self.mean[device] = mean_a + delta * n_b / n
+        self.M2[device] = self.M2[device] + M2_b + delta ** 2 * n_a * n_b / n
+        self.n[device] = n
+
+    def merge(self, other):
+        """Adds the sweeps counted by another RunningStats (other run, chunk or worker). Returns self."""
+        for device in other.n:
+            self._combine(device, other.n[device], other.mean[device], other.M2[device])
+        return self
+
+    def std(self, device):
+        n = self.n[device]
+        return np.sqrt(self.M2[device] / (n - 1)) if n > 1 else np.nan
+
+    def to_frame(self, counts=False):
+        """Same layout as analysis.get_G_average: index device, columns G_mean, G_std, G_sterr.
+        counts=True adds the number of sweeps per device as column n."""
+        devices = sorted(self.n, key=device_order)
+        n = np.array([self.n[device] for device in devices], dtype=np.float64)
+        mean = np.array([self.mean[device] for device in devices])
+        M2 = np.array([self.M2[device] for device in devices])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            std = np.where(n > 1, np.sqrt(M2 / (n - 1)), np.nan)
+        dfa = pd.DataFrame({'G_mean': mean, 'G_std': std, 'G_sterr': std / np.sqrt(n)},
+                           index=pd.Index(devices, name='device'))
+        if counts:
+            dfa['n'] = n.astype(np.int64)
+        return dfa
+
+    def live_summary(self, live_devices):
+        """Mean G and mean std of the given devices, the G_mean_live annotation of the summary plot."""
+        live_devices = [device for device in live_devices if device in self.n]
+        if not live_devices:
+            return np.nan, np.nan
+        G_mean = np.mean([self.mean[device] for device in live_devices])
+        G_std = np.nanmean([self.std(device) for device in live_devices]) if any(
+            self.n[device] > 1 for device in live_devices) else np.nan
+        return G_mean, G_std
@@ -0,0 +1,59 @@
+"""
+Scan order for the devices on the multiplexer. Visiting the devices in numeric order jumps between the four MUX
+enable lines and flips many address bits. scan_order groups the devices by enable line, walks each group in Gray
+code order of the address bits and picks the group order and directions with the fewest pin toggles.
+Rows of the truth table are [A3, A2, A1, A0, E1, E2, E3, E4] as in pi_control.PiMUX.TruthTable.
+"""
+from itertools import permutations, product
+
+
+def switch_cost(row_a, row_b, enable_weight=4):
+    """Pin toggles needed to switch from row_a to row_b. Enable line changes count enable_weight times,
+    they switch a whole MUX and take longer to settle."""
+    address = sum(a != b for a, b in zip(row_a[:4], row_b[:4]))
+    enable = sum(a != b for a, b in zip(row_a[4:], row_b[4:]))
+    return address + enable_weight * enable
+
+
+def order_cost(order, TruthTable, start=0, cyclic=True, enable_weight=4):
+    """Total switch cost of visiting order starting from output start. With cyclic=True the step from the last
+    device back to the first (the start of the next repeat) is included."""
+    rows = [TruthTable[device] for device in order]
+    cost = switch_cost(TruthTable[start], rows[0], enable_weight) if rows else 0
+    for row_a, row_b in zip(rows[:-1], rows[1:]):
+        cost += switch_cost(row_a, row_b, enable_weight)
+    if cyclic and len(rows) > 1:
+        cost += switch_cost(rows[-1], rows[0], enable_weight)
+    return cost
+
+
+def gray_rank(row):
+    """Position of the address bits of a truth table row in the 4 bit Gray code sequence."""
+    value = int(''.join(str(bit) for bit in row[:4]), 2)
+    rank = 0
+    while value:
+        rank ^= value
+        value >>= 1
+    return rank
+
+
+def scan_order(deviceList, TruthTable, start=0, cyclic=True, enable_weight=4):
+    """Returns deviceList reordered to minimise the pin toggles of a repeat (see order_cost)."""
+    groups = {}
+    for device in deviceList:
+        groups.setdefault(tuple(TruthTable[device][4:]), []).append(device)
+    groups = [sorted(group, key=lambda device: gray_rank(TruthTable[device])) for group in groups.values()]
+
+    if len(groups) > 6:  # too many to try every order, keep the Gray code sorted groups as they are
+        return [device for group in groups for device in group]
+
+    best, best_cost = None, None
+    for group_order in permutations(range(len(groups))):
+        for directions in product((False, True), repeat=len(groups)):
+            order = []
+            for k, reverse in zip(group_order, directions):
+                order += groups[k][::-1] if reverse else groups[k]
+            cost = order_cost(order, TruthTable, start, cyclic, enable_weight)
+            if best_cost is None or cost < best_cost:
+                best, best_cost = order, cost
+    return best
@@ -0,0 +1,85 @@
+"""
+Settle detection after switching the multiplexer. Instead of a fixed sleep the DAQ input is sampled until the
+switching transient is within tolerance, and the time it took is remembered per channel so later repeats
+just wait the learned time.
+"""
+import time
+
+DAQ_RANGE = 20.0  # V, input range of the USB-6216 (+-10 V)
+DAQ_BITS = 16
+
+
+def daq_resolution(gain, input_range=DAQ_RANGE, bits=DAQ_BITS):
+    """Current of one ADC code (A) behind a current preamp with gain V/A (the scaleFactor of the DAQ input)."""
+    return input_range / 2 ** bits / gain
+
+
+def default_tol_abs(gain, codes=3):
+    """Absolute settle tolerance of a few ADC codes. Between sweeps the bias is 0 V, so tol_rel adds nothing and a
+    tolerance below the quantisation noise would never be met."""
+    return codes * daq_resolution(gain)
+
+
+class SettleDetector:
+
+    def __init__(self, read, timeout=0.5, window=3, interval=0.005, tol_rel=0.01, tol_abs=1e-9, margin=1.2,
+                 clock=time):
+        """read() returns one reading of the DAQ input (e.g. daqin_D.read).
+        clock provides time() and sleep(), the time module by default (see backends.FakeClock).
+        The channel counts as settled once the last window readings spread by less than
+        tol_abs + tol_rel * |mean|, tol_abs has to be above the read noise (see default_tol_abs).
+        timeout is the longest wait, the old fixed 0.5 s by default.
+        Learned settle times are multiplied by margin before they are reused."""
+        self.read = read
+        self.timeout = timeout
+        self.window = window
+        self.interval = interval
+        self.tol_rel = tol_rel
+        self.tol_abs = tol_abs
+        self.margin = margin
+        self.clock = clock
+        self.settle_times = {}  # device -> learned settle time in s
+        self.timeouts = set()
+
+    def measure(self, device):
+        """Samples the input until it has settled or timeout is reached. Returns and caches the elapsed time."""
+        t_start = self.clock.time()
+        readings = []
+        while True:
+            readings.append(self.read())
+            elapsed = self.clock.time() - t_start
+            last = readings[-self.window:]
+            if len(last) == self.window:
+                mean = sum(last) / self.window
+                if max(last) - min(last) <= self.tol_abs + self.tol_rel * abs(mean):
+                    break
+            if elapsed >= self.timeout:
+                self.timeouts.add(device)
+                break
+            self.clock.sleep(self.interval)
+        self.settle_times[device] = elapsed
+        return elapsed
+
+    def wait(self, device):
+        """Waits for device to settle, measuring it the first time and reusing the learned time afterwards."""
+        if device in self.settle_times:
+            wait_time = min(self.settle_times[device] * self.margin, self.timeout)
+            self.clock.sleep(wait_time)
+            return wait_time
+        return self.measure(device)
+
+    def relearn(self, device=None):
+        """Forgets the learned time of one device (or all), it is measured again on the next wait."""
+        if device is None:
+            self.settle_times.clear()
+            self.timeouts.clear()
+        else:
+            self.settle_times.pop(device, None)
+            self.timeouts.discard(device)
+
+    def report(self):
+        settle_times = {device: round(t, 4) for device, t in self.settle_times.items()}
+        text = 'learned settle times (s): ' + str(settle_times) + '\n'
+        if self.timeouts:
+            text += 'settle timeout for devices: ' + str(sorted(self.timeouts, key=str)) + '\n'
+        return text
@@ -1,20 +1,47 @@
 import pandas as pd
 import numpy as np
-import random
 import matplotlib.pyplot as plt
 
+# device classes of the synthetic data: G drops at the event, G rises at the event, dead (G = 0)
+DROP, RISE, DEAD = 0, 1, 2
 
-def rand_split(l, ratio=[0.8, 0.1, 0.1]):
-    l1, l2, l3 = [], [], []
-    for e in l:
-        val = random.random()
-        if val <= ratio[0]:
-            l1.append(e)
-        elif val <= ratio[1]+ratio[0]:
-            l2.append(e)
-        else:
-            l3.append(e)
-    return l1, l2, l3
+
+def make_rng(seed=None):
+    """numpy Generator from a seed (int, SeedSequence, None for fresh entropy) or an existing Generator."""
+    return seed if isinstance(seed, np.random.Generator) else np.random.default_rng(seed)
+
+
+def make_seed_sequence(seed=None):
+    """SeedSequence from a seed, an existing SeedSequence or a Generator (a seed is drawn from it)."""
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    if isinstance(seed, np.random.Generator):
+        return np.random.SeedSequence(int(seed.integers(2 ** 63)))
+    return np.random.SeedSequence(seed)
+
+
+def draw_classes(n_devices, ratio=[0.8, 0.1, 0.1], seed=None):
+    """Class (DROP, RISE or DEAD) of every device, drawn with the probabilities in ratio."""
+    values = make_rng(seed).random(n_devices)
+    return np.minimum(np.searchsorted(np.cumsum(ratio), values), DEAD)
+
+
+def rand_split(l, ratio=[0.8, 0.1, 0.1], seed=None):
+    """Splits the devices in l into three lists (drop, rise, dead) at random."""
+    classes = draw_classes(len(l), ratio, seed)
+    return tuple([e for e, c in zip(l, classes) if c == k] for k in (DROP, RISE, DEAD))
+
+
+def draw_levels(classes, seed=None):
+    """G before (G1) and after (G2) the event for devices of the given classes.
+    Live devices have G1 around 0.1, falling by about 15 % (DROP) or rising by about 9 % (RISE); dead ones 0."""
+    rng = make_rng(seed)
+    classes = np.asarray(classes)
+    live = classes != DEAD
+    G1 = np.where(live, 0.02 * rng.standard_normal(classes.shape) + 0.1, 0.0)
+    change = 0.005 * rng.standard_normal(classes.shape)
+    G2 = np.select([classes == DROP, classes == RISE], [G1 - (change + 0.15 * G1), G1 + (change + 0.09 * G1)], 0.0)
+    return G1, G2
 
 
 def generate_data(device_list=np.array([i for i in range(1, 46)]),
@@ -24,43 +51,23 @@ def generate_data(device_list=np.array([i for i in range(1, 46)]),
                   percent_rise=0.2,
                   drop_vs_rise=0.8,
                   plot=False,
-                  print_Gf=False):
-
-    l1, l2, l3 = rand_split(device_list)
-    device_list = np.array(device_list)
-
-    # Generate G1
-    G1 = np.zeros(device_list.shape[0])
-    for i, e in enumerate(device_list):
-        if e in l1 or e in l2:
-            G1[i] = 0.02 * np.random.randn(1) + 0.1
-        else:
-            G1[i] = 0
-
-    # Generate G2
-    G2 = np.zeros(device_list.shape[0])
-    for i, e in enumerate(device_list):
-        if e in l1:
-            G2[i] = G1[i] - (0.005 * np.random.randn(1) + 0.15*G1[i])
-        elif e in l2:
-            G2[i] = G1[i] + (0.005 * np.random.randn(1) + 0.09*G1[i])
-        else:
-            G2[i] = 0
-
-    Gf = np.zeros((device_list.shape[0], repeats))
-
-    # Generate repeats
-    for j in range(repeats):
-        for i, e in enumerate(device_list):
-            if j < event_repeat:
-                Gf[i-1,j] = 0.0001 * np.random.randn(1) + G1[i-1]
-            else:
-                Gf[i-1, j] = 0.0001 * np.random.randn(1) + G2[i-1]
+                  print_Gf=False,
+                  seed=None,
+                  ratio=[0.8, 0.1, 0.1]):
+    """G of every device (rows, in the order of device_list) and repeat (columns), with a step at event_repeat.
+    seed (int or numpy Generator) makes the data reproducible. ratio gives the share of drop, rise and dead
+    devices."""
+    rng = make_rng(seed)
+    n_devices = len(device_list)
+
+    classes = draw_classes(n_devices, ratio, rng)
+    G1, G2 = draw_levels(classes, rng)
+    levels = np.where(np.arange(repeats) < event_repeat, G1[:, None], G2[:, None])
+    Gf = levels + 0.0001 * rng.standard_normal((n_devices, repeats))
 
     if plot:
-        x = np.arange(len(device_list))
-        for i,e in enumerate(device_list):
-            plt.plot([r for r in range(repeats)],Gf[i-1])
+        for i in range(n_devices):
+            plt.plot(np.arange(repeats), Gf[i])
 
     if print_Gf:
         print(Gf)
@@ -68,11 +75,53 @@ def generate_data(device_list=np.array([i for i in range(1, 46)]),
     return Gf
 
 
-def generate_IV(G, V_SD):
-    V_SD = np.array(V_SD)
-    noise = np.random.randn(V_SD.shape[0])
-    I = V_SD*G*(1+0.01*noise)
-    return I
+def generate_IV(G, V_SD, seed=None):
+    """I_SD = V_SD * G with 1 % noise. G can be a number (one sweep) or an array of any shape, e.g. the device x
+    repeat matrix of generate_data; the result then has shape G.shape + (len(V_SD),)."""
+    V_SD = np.asarray(V_SD, dtype=np.float64)
+    G = np.asarray(G, dtype=np.float64)[..., None]
+    noise = make_rng(seed).standard_normal(G.shape[:-1] + V_SD.shape)
+    return V_SD * G * (1 + 0.01 * noise)
+
+
+def iter_IV_chunks(G, V_SD, chunksize=100000, seed=None):
+    """Generates the sweeps of a device x repeat G matrix in measurement order (repeat by repeat, devices in
+    row order) in blocks of at most chunksize sweeps, so the full I_SD tensor never has to be in memory.
+    Yields (device index, repeat index, I_SD block); each block is drawn from its own child of one
+    SeedSequence, the sweeps depend on seed and chunksize only."""
+    G = np.asarray(G, dtype=np.float64)
+    order = G.T.reshape(-1)  # repeat-major, like the measurement loop
+    n_devices = G.shape[0]
+    n_chunks = max(-(-order.size // chunksize), 1)
+    seeds = make_seed_sequence(seed).spawn(n_chunks)
+    for k, start in enumerate(range(0, order.size, chunksize)):
+        flat = np.arange(start, min(start + chunksize, order.size))
+        yield flat % n_devices, flat // n_devices, generate_IV(order[flat], V_SD, seeds[k])
+
+
+def iter_sweep_tables(G, V_SD, device_list, chunksize=100000, seed=None, store=None):
+    """Generates and fits the sweeps of a G matrix chunk by chunk (iter_IV_chunks). Each block goes straight
+    into fitting.fit_sweeps and, if given, a sweep_store.SweepStore. Yields (results table, I_SD block) per
+    chunk, the table has the columns ID, repeat, device, G and std_err, IDs count from 1 in measurement order."""
+    from fitting import fit_sweeps
+
+    device_list = np.asarray(device_list)
+    V_SD = np.asarray(V_SD, dtype=np.float64)
+    n = 0
+    for devices, repeats, I_SD in iter_IV_chunks(G, V_SD, chunksize, seed):
+        ID = np.arange(n + 1, n + len(I_SD) + 1)
+        n += len(I_SD)
+        fit = fit_sweeps(V_SD, I_SD)
+        if store is not None:
+            store.append(ID, np.broadcast_to(V_SD, I_SD.shape), I_SD)
+        yield pd.DataFrame({'ID': ID, 'repeat': repeats, 'device': device_list[devices],
+                            'G': fit['slope'], 'std_err': fit['std_err']}), I_SD
+
+
+def synthesize_sweeps(G, V_SD, device_list, chunksize=100000, seed=None, store=None):
+    """All chunks of iter_sweep_tables in one scalar results table (ID, repeat, device, G, std_err)."""
+    parts = [table for table, I_SD in iter_sweep_tables(G, V_SD, device_list, chunksize, seed, store)]
+    return pd.concat(parts, ignore_index=True)
 
 
 if __name__ == '__main__':
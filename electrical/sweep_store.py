@@ -0,0 +1,96 @@
+"""
+Binary storage for the raw V_SD/I_SD sweeps of a run. Each sweep is one fixed width row in a flat float file
+(read back through np.memmap), so loading a single IV trace is a slice instead of parsing the master csv.
+
+Layout of a store folder:
+    meta.json   number of points per sweep and dtype
+    ID.bin      int64 sweep IDs, one per row
+    V_SD.bin    float rows of n_points
+    I_SD.bin    float rows of n_points
+Rows are only ever appended, so the files can grow while a measurement is running.
+"""
+import json
+import numpy as np
+from pathlib import Path
+
+
+def store_path(basePath, fileName):
+    """Default location of the sweep store belonging to a run."""
+    return basePath + '/' + fileName + '_sweeps'
+
+
+class SweepStore:
+
+    def __init__(self, path):
+        """Opens an existing store. Use SweepStore.create for a new one."""
+        self.path = Path(path)
+        with open(self.path / 'meta.json', 'r') as f:
+            meta = json.load(f)
+        self.n_points = meta['n_points']
+        self.dtype = np.dtype(meta['dtype'])
+        self._maps = {}
+
+    @classmethod
+    def create(cls, path, n_points, dtype='float64'):
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        with open(path / 'meta.json', 'w') as f:
+            json.dump({'n_points': int(n_points), 'dtype': np.dtype(dtype).name}, f)
+        for name in ('ID', 'V_SD', 'I_SD'):
+            open(path / (name + '.bin'), 'wb').close()
+        return cls(path)
+
+    def __len__(self):
+        return (self.path / 'ID.bin').stat().st_size // 8
+
+    def append(self, ID, V_SD, I_SD):
+        """Appends one sweep (1-D V_SD/I_SD) or a block of sweeps (2-D, one row per ID)."""
+        ID = np.atleast_1d(np.asarray(ID, dtype=np.int64))
+        V_SD = np.asarray(V_SD, dtype=self.dtype).reshape(len(ID), self.n_points)
+        I_SD = np.asarray(I_SD, dtype=self.dtype).reshape(len(ID), self.n_points)
+        # sweep data first, IDs last: the ID file decides how many rows count as written
+        for name, values in (('V_SD', V_SD), ('I_SD', I_SD), ('ID', ID)):
+            with open(self.path / (name + '.bin'), 'ab') as f:
+                f.write(values.tobytes())
+
+    def _map(self, name):
+        n = len(self)
+        cached = self._maps.get(name)
+        if cached is None or len(cached) != n:
+            if name == 'ID':
+                dtype, shape = np.int64, (n,)
+            else:
+                dtype, shape = self.dtype, (n, self.n_points)
+            if n == 0:
+                return np.zeros(shape, dtype=dtype)  # np.memmap can't map an empty file
+            cached = np.memmap(self.path / (name + '.bin'), dtype=dtype, mode='r', shape=shape)
+            self._maps[name] = cached
+        return cached
+
+    @property
+    def IDs(self):
+        return self._map('ID')
+
+    @property
+    def V_SD(self):
+        return self._map('V_SD')
+
+    @property
+    def I_SD(self):
+        return self._map('I_SD')
+
+    def index(self, ID):
+        """Row number of a sweep ID. IDs are written in increasing order, so this is a binary search."""
+        IDs = self.IDs
+        k = int(np.searchsorted(IDs, ID))
+        if k < len(IDs) and IDs[k] == ID:
+            return k
+        hits = np.flatnonzero(IDs == ID)  # IDs not sorted, e.g. stores merged by hand
+        if len(hits) == 0:
+            raise KeyError('sweep ID ' + str(ID) + ' not in ' + str(self.path))
+        return int(hits[0])
+
+    def get(self, ID):
+        """Returns (V_SD, I_SD) of one sweep as arrays."""
+        k = self.index(ID)
+        return np.array(self.V_SD[k]), np.array(self.I_SD[k])
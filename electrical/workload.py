@@ -0,0 +1,139 @@
+"""
+Synthetic workloads shaped like production data: many chips, each a run folder in the layout micr_measure writes
+    comments.txt                   header parsed by catalog.py, average values, finish time
+    <fileName>.csv                 master results table
+    <fileName>_sweeps/             raw sweeps in a sweep_store.SweepStore
+    devices/<fileName>_device_N.csv
+The G data of a chip comes from simulation_utils.generate_data, the sweeps from simulation_utils.iter_sweep_tables.
+Every table is written chunk by chunk as it is generated, so the memory of a worker does not depend on the size of
+the dataset. Chips are spread over a process pool; chip k always gets child k of one SeedSequence, so a seeded
+dataset is the same with any number of processes and its first chips do not change when more are added.
+"""
+import numpy as np
+import pandas as pd
+from pathlib import Path
+import simulation_utils
+from backends import sweep_array
+from parallel import map_tasks
+from running_stats import RunningStats
+from sweep_store import SweepStore, store_path
+
+MASTER_COLUMNS = ['ID', 'repeat', 'time', 'datetime', 'device', 'V_SD', 'I_SD', 'G', 'std_err']
+
+
+def _list_reprs(a):
+    """Rows of a 2-D array as the list reprs micr_measure writes to its csv files."""
+    return [str(row) for row in a.tolist()]
+
+
+def _write_chip(task):
+    """Generates and writes one run folder in a worker. Returns (path, sweeps, bytes)."""
+    path, fileName, settings, start, seed = task
+    path = Path(path)
+    device_list = settings['device_list']
+    repeats = settings['repeats']
+    event_repeat = settings['event_repeat']
+    V_SD = sweep_array(settings['start_end_step'])
+    G_seed, IV_seed = seed.spawn(2)
+    G = simulation_utils.generate_data(device_list=device_list, repeats=repeats, event_repeat=event_repeat,
+                                       seed=np.random.default_rng(G_seed), ratio=settings['ratio'])
+
+    path.mkdir(parents=True, exist_ok=True)
+    (path / 'devices').mkdir(exist_ok=True)
+    basePath = str(path).replace('\\', '/')
+    with open(path / 'comments.txt', 'w') as f:
+        f.write('start: ' + str(start) + '\n' +
+                'Filename: ' + fileName + '\n' +
+                'repeats = ' + str(repeats) + '\n' +
+                'Preamp gain = ' + str(settings['gain']) + '\n' +
+                'IV start, stop, step = ' + str(settings['start_end_step']) + '\n' +
+                'device type = ' + settings['device_type'] + '\n' +
+                'data at: ' + basePath + '\n \n' +
+                'comment = synthetic workload, event at repeat ' + str(event_repeat) + '\n \n'
+                )
+
+    store = SweepStore.create(store_path(basePath, fileName), len(V_SD)) if settings['store'] else None
+    stats = RunningStats()
+    master = path / (fileName + '.csv')
+    first = True
+    n = 0
+    for table, I_SD in simulation_utils.iter_sweep_tables(G, V_SD, device_list, settings['chunksize'], IV_seed,
+                                                          store):
+        n += len(table)
+        table['time'] = (table['ID'] - 1) * settings['sweep_time']  # s since the start of the run
+        table['datetime'] = start + pd.to_timedelta(table['time'], unit='s')
+        if settings['csv_sweeps']:
+            table['V_SD'] = _list_reprs(np.broadcast_to(V_SD, I_SD.shape))
+            table['I_SD'] = _list_reprs(I_SD)
+        table = table[[name for name in MASTER_COLUMNS if name in table]]
+        table.index = table['ID'].to_numpy() - 1  # row number, the unnamed first column of a MasterDF csv
+        table.to_csv(master, mode='w' if first else 'a', header=first)
+        if settings['device_csvs']:
+            for device, df_ind in table.groupby('device', sort=False):
+                df_ind.to_csv(path / 'devices' / (fileName + '_device_' + str(device) + '.csv'),
+                              mode='w' if first else 'a', header=first)
+        stats.update_many(table['device'].to_numpy(), table['G'].to_numpy())
+        first = False
+
+    with open(path / 'comments.txt', 'a') as f:
+        f.write('average values: \n' + stats.to_frame().to_string() + '\n \n' +
+                'measurement finished at ' + str(start + pd.Timedelta(seconds=n * settings['sweep_time'])))
+    size = sum(p.stat().st_size for p in path.rglob('*') if p.is_file())
+    return str(path), n, size
+
+
+def generate_workload(root,
+                      n_chips=10,
+                      device_list=[i for i in range(1, 47)],
+                      repeats=1000,
+                      event_repeat=None,
+                      start_end_step=[0, -0.5, 0.1],
+                      device_types=['unknown'],
+                      ratio=[0.8, 0.1, 0.1],
+                      store=True,
+                      csv_sweeps=False,
+                      device_csvs=True,
+                      start='2021-01-01',
+                      run_interval='8h',
+                      sweep_time=0.6,
+                      gain=1E3,
+                      chunksize=100000,
+                      seed=None,
+                      n_jobs=None,
+                      prefix='chip'):
+    """Writes n_chips run folders <prefix>_0000, <prefix>_0001, ... below root.
+    Each chip measures device_list for repeats repeats with the G step at event_repeat (repeats // 2 if None).
+    device_types are assigned to the chips in turn. Run k starts at start + k * run_interval, its sweeps are
+    sweep_time s apart. Raw sweeps go into the run's SweepStore (store=True) and/or as list columns into the
+    master csv (csv_sweeps=True, like micr_measure, but much bigger on disk). device_csvs=False skips devices/.
+    chunksize is the number of sweeps a worker holds in memory, n_jobs the number of processes (parallel.map_tasks:
+    all CPUs if None, 1 runs in this process). Returns a table indexed by run with path, sweeps and bytes written."""
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    settings = {'device_list': list(device_list), 'repeats': repeats,
+                'event_repeat': repeats // 2 if event_repeat is None else event_repeat,
+                'start_end_step': list(start_end_step), 'ratio': list(ratio), 'store': store,
+                'csv_sweeps': csv_sweeps, 'device_csvs': device_csvs, 'sweep_time': sweep_time, 'gain': gain,
+                'chunksize': chunksize}
+    seeds = simulation_utils.make_seed_sequence(seed).spawn(n_chips)
+    start = pd.Timestamp(start)
+    tasks = []
+    for k in range(n_chips):
+        fileName = prefix + '_' + str(k).zfill(4)
+        chip = dict(settings, device_type=device_types[k % len(device_types)])
+        tasks.append((root / fileName, fileName, chip, start + k * pd.Timedelta(run_interval), seeds[k]))
+
+    results = map_tasks(_write_chip, tasks, n_jobs)
+    summary = pd.DataFrame(results, columns=['path', 'sweeps', 'bytes'])
+    summary.index = pd.Index([Path(p).name for p in summary['path']], name='run')
+    return summary
+
+
+if __name__ == '__main__':
+    import time
+
+    t0 = time.time()
+    summary = generate_workload('synthetic_workload', n_chips=8, repeats=500, seed=0)
+    print(summary)
+    print(str(summary['sweeps'].sum()) + ' sweeps, ' + str(round(summary['bytes'].sum() / 1e6, 1)) + ' MB in ' +
+          str(round(time.time() - t0, 1)) + ' s')